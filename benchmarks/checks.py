@@ -0,0 +1,107 @@
+"""Checks that the vectorised aggregations give the same results as the groupby paths
+they replace, on the synthetic data (see `benchmarks.fixtures`).
+
+The keys are checked both as strings and as categoricals (as in the compact frames),
+with some of them missing: rows with missing keys must stay in groups of their own.
+
+    python -m benchmarks.checks
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import fixtures
+from scripts.debt import tools
+from scripts.inflation.inflation_charts import regional_weighted_averages
+
+IDX: list = ["year", "continent", "counterpart_area"]
+
+
+def _with_missing_keys(df: pd.DataFrame, columns: list, every: int = 7) -> pd.DataFrame:
+    """Remove the keys of every n-th row."""
+    df = df.copy()
+    df.loc[df.index[::every], columns] = np.nan
+
+    return df
+
+
+def _categorical(df: pd.DataFrame, columns: list) -> pd.DataFrame:
+    return df.astype({column: "category" for column in columns})
+
+
+def _as_objects(df: pd.DataFrame, columns: list) -> pd.DataFrame:
+    return df.astype({column: "object" for column in columns})
+
+
+def check_weighted_group_averages(scale: fixtures.Scale) -> None:
+    """Categorical and string keys give the same groups and averages, which match
+    add_weights and compute_weighted_averages for the groups without missing keys."""
+    keys = ["continent", "counterpart_area"]
+    loans = _with_missing_keys(fixtures.loans_data(scale), keys)
+
+    strings = tools.weighted_group_averages(loans, idx=IDX)
+    categories = tools.weighted_group_averages(_categorical(loans, keys), idx=IDX)
+
+    pd.testing.assert_frame_equal(_as_objects(categories, keys), strings)
+
+    expected = (
+        tools.add_weights(loans, idx=IDX, value_column="value_commitments")
+        .pipe(tools.compute_weighted_averages, idx=IDX)
+        .dropna(subset=keys)
+        .filter(strings.columns)
+        .reset_index(drop=True)
+    )
+    pd.testing.assert_frame_equal(
+        strings.dropna(subset=keys).reset_index(drop=True), expected
+    )
+
+
+def check_regional_weighted_averages(scale: fixtures.Scale) -> None:
+    """Categorical and string keys give the same groups and averages."""
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2020-01-01", periods=scale.years, freq="MS")
+    iso_codes = [f"C{i:03d}" for i in range(scale.debtors)]
+
+    df = pd.MultiIndex.from_product(
+        [dates, ["Inflation Rate", "Food Inflation"], iso_codes],
+        names=["date", "indicator_name", "iso_code"],
+    ).to_frame(index=False)
+    df = _with_missing_keys(
+        df.assign(
+            value=rng.normal(5, 3, len(df)).round(1),
+            value_ppp=rng.lognormal(10, 2, len(df)),
+        ),
+        ["indicator_name"],
+    )
+
+    regions = {"World": (None, 1), "Some": (tuple(iso_codes[::2]), 2)}
+    strings = regional_weighted_averages(df, regions)
+    categories = regional_weighted_averages(
+        _categorical(df, ["indicator_name"]), regions
+    )
+
+    assert strings.indicator_name.isna().any(), "Missing keys were dropped"
+    pd.testing.assert_frame_equal(_as_objects(categories, ["indicator_name"]), strings)
+
+
+CHECKS: list = [check_weighted_group_averages, check_regional_weighted_averages]
+
+
+if __name__ == "__main__":
+    failed = False
+
+    for name, scale in fixtures.SCALES.items():
+        if name == "large":
+            continue
+
+        for check in CHECKS:
+            try:
+                check(scale)
+                print(f"{check.__name__}[{name}]: ok")
+            except AssertionError as e:
+                failed = True
+                print(f"{check.__name__}[{name}]: FAILED\n{e}")
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,149 @@
+"""Deterministic synthetic data shaped like the IDS data.
+
+The data is generated from a fixed seed, so every run of the benchmarks uses the
+same data. Debtors are called "Debtor 0001", etc. Their income level and continent
+are assigned in rotation. The first counterparts are the counterparts studied in the
+analysis, and the rest are called "Lender 01", etc.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from scripts.debt.interest_analysis import (
+    COMMITMENTS_INDICATORS,
+    GRACE_PERIOD_INDICATOR,
+    INTEREST_RATE_INDICATOR,
+    MATURITY_INDICATOR,
+    study_counterparts,
+)
+
+INCOME_LEVELS: list = [
+    "Low income",
+    "Lower middle income",
+    "Upper middle income",
+    "High income",
+]
+
+CONTINENTS: list = ["Africa", "America", "Asia", "Europe", "Oceania"]
+
+
+@dataclass(frozen=True)
+class Scale:
+    """The size of a synthetic dataset."""
+
+    name: str
+    debtors: int
+    years: int
+    counterparts: int
+
+    @property
+    def end_year(self) -> int:
+        return 2021
+
+    @property
+    def start_year(self) -> int:
+        return self.end_year - self.years + 1
+
+
+SCALES: dict[str, Scale] = {
+    "small": Scale("small", debtors=10, years=5, counterparts=4),
+    "medium": Scale("medium", debtors=100, years=20, counterparts=10),
+    "large": Scale("large", debtors=1_000, years=50, counterparts=40),
+}
+
+
+def debtors(scale: Scale) -> pd.DataFrame:
+    """The debtors, with their income level and continent."""
+    positions = np.arange(scale.debtors)
+
+    return pd.DataFrame(
+        {
+            "country": [f"Debtor {i:04d}" for i in positions],
+            "income_level": np.array(INCOME_LEVELS)[positions % len(INCOME_LEVELS)],
+            "continent": np.array(CONTINENTS)[positions % len(CONTINENTS)],
+        }
+    )
+
+
+def counterparts(scale: Scale) -> list[str]:
+    """The counterparts, starting with the counterparts studied in the analysis."""
+    studied = list(study_counterparts())
+    others = [f"Lender {i:02d}" for i in range(1, scale.counterparts - 3)]
+
+    return (studied + others)[: scale.counterparts]
+
+
+def _series_values(code: str, rng: np.random.Generator, size: int) -> np.ndarray:
+    """Plausible values for a series code."""
+    if code == INTEREST_RATE_INDICATOR:
+        return rng.uniform(0.0, 9.0, size).round(2)
+    if code == GRACE_PERIOD_INDICATOR:
+        return rng.uniform(0.0, 10.0, size).round(1)
+    if code == MATURITY_INDICATOR:
+        return rng.uniform(5.0, 40.0, size).round(1)
+
+    # Amounts in current US dollars, some of them zero
+    values = rng.lognormal(17, 2, size).round(0)
+    values[rng.random(size) < 0.2] = 0.0
+
+    return values
+
+
+def ids_data(scale: Scale, seed: int = 0) -> pd.DataFrame:
+    """Raw IDS data, in the format returned by `DebtIDS.get_data`, for the series
+    codes of the loans data (commitments, rates, grace periods and maturities)."""
+    rng = np.random.default_rng(seed)
+
+    codes = list(COMMITMENTS_INDICATORS) + [
+        INTEREST_RATE_INDICATOR,
+        GRACE_PERIOD_INDICATOR,
+        MATURITY_INDICATOR,
+    ]
+
+    index = pd.MultiIndex.from_product(
+        [
+            codes,
+            debtors(scale).country,
+            counterparts(scale),
+            pd.date_range(f"{scale.start_year}", periods=scale.years, freq="YS"),
+        ],
+        names=["series_code", "country", "counterpart_area", "year"],
+    ).to_frame(index=False)
+
+    return index.assign(
+        value=np.concatenate(
+            [_series_values(code, rng, len(index) // len(codes)) for code in codes]
+        )
+    )
+
+
+def loans_data(scale: Scale, seed: int = 0) -> pd.DataFrame:
+    """Merged loans data, as returned by
+    `get_merged_rates_commitments_grace_maturities_data`, for all counterparts."""
+    rng = np.random.default_rng(seed)
+
+    index = (
+        pd.MultiIndex.from_product(
+            [
+                debtors(scale).country,
+                counterparts(scale),
+                range(scale.start_year, scale.end_year + 1),
+            ],
+            names=["country", "counterpart_area", "year"],
+        )
+        .to_frame(index=False)
+        .merge(debtors(scale), on="country", how="left")
+    )
+
+    size = len(index)
+
+    return index.filter(
+        ["country", "counterpart_area", "income_level", "continent", "year"]
+    ).assign(
+        value_commitments=rng.lognormal(17, 2, size).round(0),
+        value_rate=_series_values(INTEREST_RATE_INDICATOR, rng, size),
+        value_grace=_series_values(GRACE_PERIOD_INDICATOR, rng, size),
+        value_maturities=_series_values(MATURITY_INDICATOR, rng, size),
+    )
@@ -0,0 +1,60 @@
+"""Import time of the pipeline entry points.
+
+Each module is imported in a fresh Python process, which reports how long the import
+took and which of the heavy dependencies it loaded. The Fed charts modules are
+included to check that a single job doesn't load every subsystem.
+
+    python -m benchmarks.imports --repeat 5
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT = Path(__file__).resolve().parent.parent
+
+MODULES: list[str] = [
+    "scripts.visualisations.update_visualisations",
+    "scripts.update_data",
+    "scripts.fed_rates.rates_chart",
+    "scripts.debt.currency",
+]
+
+HEAVY: list[str] = ["pandas", "requests", "bblocks", "country_converter"]
+
+RUN = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps([seconds, [m for m in {heavy!r} if m in sys.modules]]))
+"""
+
+
+def import_time(module: str) -> tuple[float, list[str]]:
+    """Import a module in a new process. Returns the seconds taken and the heavy
+    dependencies which were loaded."""
+    result = subprocess.run(
+        [sys.executable, "-c", RUN.format(module=module, heavy=HEAVY)],
+        cwd=PROJECT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    seconds, loaded = json.loads(result.stdout.strip().splitlines()[-1])
+
+    return seconds, loaded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for module in args.modules:
+        runs = [import_time(module) for _ in range(args.repeat)]
+        seconds = min(run[0] for run in runs)
+        print(f"{module}: {seconds:.3f}s (loads {', '.join(runs[0][1]) or 'none'})")
@@ -0,0 +1,145 @@
+"""Peak memory (RSS) of the interest rate charts (`update_interest_data_and_charts`).
+
+Each chart runs in a separate Python process, which reports its own peak RSS. With
+--baseline, the same charts are also measured on a git revision, checked out in a
+temporary worktree. Worktree runs start with an empty cache, so use --clear-cache to
+compare the current tree on the same terms.
+
+The runs only read the IDS data in raw_data: the data is not updated, and anything
+missing from raw_data fails the chart instead of being downloaded. The charts are
+written to a temporary folder, so the output files of the tree are not changed.
+Charts which fail at a revision (e.g. because of a bug fixed later, or missing
+data) are reported, and only the charts which ran in both trees are compared.
+
+    python benchmarks/memory.py --baseline HEAD~1 --clear-cache
+"""
+
+import argparse
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+PROJECT = Path(__file__).resolve().parent.parent
+
+# The charts of `update_interest_data_and_charts`, with their arguments
+CHARTS: dict[str, dict] = {
+    "export_africa_geometries": {},
+    "chart_scrolly_bars_africa_bonds_vs_ibrd_rates": {},
+    "chart_scrolly_bars_mics_bonds_vs_ibrd_rates": {},
+    "chart_africa_other_bondholders_ibrd_line": {"start_year": 2000, "end_year": 2021},
+    "chart_data_africa_other_rates_scatter": {"start_year": 2000, "end_year": 2021},
+    "chart_scrolly_chart_map_africa_ibrd_2021_rates": {},
+    "chart_scrolly_chart_map_africa_bonds_2021_rates": {},
+}
+
+RUN = """
+import resource, sys, tempfile
+from pathlib import Path
+from bblocks import DebtIDS
+from scripts import config
+
+def local_only(self, indicator, *args, **kwargs):
+    raise FileNotFoundError(f"{{indicator}} is not in raw_data")
+
+# Only read the IDS data on disk
+DebtIDS._get_indicator = local_only
+if hasattr(config, "set_bblocks_path"):
+    config.set_bblocks_path()
+if {clear_cache}:
+    from scripts.debt.cache import clear_cache
+    clear_cache()
+
+from scripts.visualisations import interest_flourish
+with tempfile.TemporaryDirectory() as output:
+    config.Paths.output = Path(output)
+    getattr(interest_flourish, {chart!r})(**{kwargs!r})
+
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+# ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+print(peak if sys.platform == "darwin" else peak * 1024)
+"""
+
+
+def chart_peak_rss(tree: Path, chart: str, clear_cache: bool = False) -> int | None:
+    """Run a chart in the tree and return its peak RSS, in bytes (None if it
+    failed)."""
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            RUN.format(clear_cache=clear_cache, chart=chart, kwargs=CHARTS[chart]),
+        ],
+        cwd=tree,
+        capture_output=True,
+        text=True,
+    )
+
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()[-1:] or ["no output"]
+        print(f"{chart} failed in {tree}: {error[0]}", file=sys.stderr)
+        return None
+
+    return int(result.stdout.strip().splitlines()[-1])
+
+
+def peak_rss(tree: Path, clear_cache: bool = False) -> dict[str, int | None]:
+    """The peak RSS of each chart in the tree, in bytes (None if it failed). Only
+    the first run clears the cache."""
+    return {
+        chart: chart_peak_rss(tree, chart, clear_cache=clear_cache and i == 0)
+        for i, chart in enumerate(CHARTS)
+    }
+
+
+def baseline_peak_rss(revision: str) -> dict[str, int | None]:
+    """Peak RSS of each chart at a git revision."""
+    with tempfile.TemporaryDirectory() as folder:
+        tree = Path(folder) / "baseline"
+        subprocess.run(
+            ["git", "worktree", "add", "--detach", str(tree), revision],
+            cwd=PROJECT,
+            capture_output=True,
+            check=True,
+        )
+
+        try:
+            return peak_rss(tree)
+        finally:
+            subprocess.run(
+                ["git", "worktree", "remove", "--force", str(tree)],
+                cwd=PROJECT,
+                capture_output=True,
+            )
+
+
+def _mb(size: int | None) -> str:
+    return "failed" if size is None else f"{size / 1024**2:,.1f} MB"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--baseline", help="git revision to compare against")
+    parser.add_argument(
+        "--clear-cache",
+        action="store_true",
+        help="Clear the cached frames of the current tree before the run",
+    )
+    args = parser.parse_args()
+
+    current = peak_rss(PROJECT, clear_cache=args.clear_cache)
+    baseline = baseline_peak_rss(args.baseline) if args.baseline else {}
+
+    for chart, size in current.items():
+        line = f"{chart}: {_mb(size)}"
+        if args.baseline:
+            line += f" (baseline {_mb(baseline[chart])})"
+        print(line)
+
+    # Compare the highest peak of the charts which ran in both trees
+    common = [c for c in CHARTS if current[c] is not None and baseline.get(c)]
+    if common:
+        peak, base = max(current[c] for c in common), max(baseline[c] for c in common)
+        print(f"peak:     {_mb(peak)} ({len(common)} charts)")
+        print(f"baseline: {_mb(base)} ({args.baseline})")
+        print(f"change:   {(peak - base) / base:+.1%}")
@@ -0,0 +1,214 @@
+"""Benchmarks for the interest rate analysis pipeline.
+
+Each case is timed on the synthetic data of every scale (see `benchmarks.fixtures`).
+The IDS reader, the name conversions and the frame cache are replaced by the
+synthetic data, so no data is downloaded or read from disk.
+
+The results can be saved as baselines and later runs compared against them. A case
+is a regression if it is slower than its baseline by more than the tolerance.
+Baselines are only comparable on the same machine.
+
+    python -m benchmarks.run --save benchmarks/baselines.json
+    python -m benchmarks.run --compare benchmarks/baselines.json
+"""
+
+import argparse
+import json
+import sys
+import time
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Callable
+from unittest import mock
+
+import pandas as pd
+
+from benchmarks import fixtures
+from scripts.debt import clean_data, interest_analysis, tools
+
+# Default allowed slowdown before a case is a regression
+TOLERANCE: float = 0.25
+
+
+def _stub_names(scale: fixtures.Scale) -> list:
+    """Replace the name conversions with lookups on the synthetic debtors."""
+    debtors = fixtures.debtors(scale).set_index("country")
+
+    def convert_id(series, from_type="regex", to_type="ISO3", not_found=None):
+        if to_type == "continent":
+            return series.map(debtors.continent)
+        return series
+
+    def add_income_level(df, id_column, target_column="income_level"):
+        return df.assign(**{target_column: df[id_column].map(debtors.income_level)})
+
+    return [
+        mock.patch.object(clean_data, "convert_id_cached", convert_id),
+        mock.patch.object(
+            clean_data, "add_income_level_column_cached", add_income_level
+        ),
+    ]
+
+
+def _merged_data(scale: fixtures.Scale) -> Callable:
+    """Build the merged loans data from the synthetic IDS data, bypassing the cache."""
+    ids = fixtures.ids_data(scale)
+    merge = interest_analysis.get_merged_rates_commitments_grace_maturities_data
+
+    def read_ids(codes, *args, **kwargs):
+        return ids.loc[ids.series_code.isin(codes)]
+
+    def run():
+        with ExitStack() as stack:
+            for patch in _stub_names(scale):
+                stack.enter_context(patch)
+            stack.enter_context(mock.patch.object(clean_data, "read_ids", read_ids))
+
+            return merge.__wrapped__(scale.start_year, scale.end_year)
+
+    return run
+
+
+def _with_loans(scale: fixtures.Scale, func: Callable) -> Callable:
+    """Run an analysis function with the synthetic loans data as its input."""
+    loans = fixtures.loans_data(scale)
+
+    def run():
+        with mock.patch.object(
+            interest_analysis,
+            "get_merged_rates_commitments_grace_maturities_data",
+            lambda *args, **kwargs: loans,
+        ):
+            return func()
+
+    return run
+
+
+def cases(scale: fixtures.Scale) -> dict[str, Callable]:
+    """The functions to time, without arguments, for a scale."""
+    loans = fixtures.loans_data(scale)
+    idx = ["year", "country", "counterpart_area"]
+    weighted = tools.add_weights(loans, idx=idx, value_column="value_commitments")
+
+    return {
+        "calculate_interest_payments": lambda: loans.apply(
+            tools.calculate_interest_payments, axis=1, discount_rate=0.05
+        ),
+        "calculate_interest_payments_batch": lambda: (
+            tools.calculate_interest_payments_batch(
+                commitments=loans.value_commitments.to_numpy(),
+                rate=loans.value_rate.to_numpy(),
+                grace=loans.value_grace.to_numpy(),
+                maturities=loans.value_maturities.to_numpy(),
+                discount_rate=0.05,
+            )
+        ),
+        "add_weights": lambda: tools.add_weights(
+            loans, idx=idx, value_column="value_commitments"
+        ),
+        "compute_weighted_averages": lambda: tools.compute_weighted_averages(weighted),
+        "get_merged_rates_commitments_grace_maturities_data": _merged_data(scale),
+        "expected_payments_on_new_debt": _with_loans(
+            scale,
+            lambda: interest_analysis.expected_payments_on_new_debt(
+                start_year=scale.start_year,
+                end_year=scale.end_year,
+                discount_rate=0.05,
+                filter_countries=True,
+                filter_type="continent",
+                filter_values="Africa",
+                add_aggregate=True,
+                aggregate_name="Africa",
+            ),
+        ),
+        "counterpart_difference": _with_loans(
+            scale,
+            lambda: interest_analysis.counterpart_difference(
+                start_year=scale.start_year,
+                end_year=scale.end_year,
+                main_counterpart="Bondholders",
+                comparison_counterpart="World Bank-IBRD",
+                filter_type="continent",
+                filter_values="Africa",
+                aggregate_name="Africa",
+            ),
+        ),
+    }
+
+
+def time_case(func: Callable, repeat: int) -> float:
+    """The best time of several runs, in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def run_benchmarks(
+    scales: list[str], repeat: int = 3, only: list[str] | None = None
+) -> dict[str, float]:
+    """Time every case at every scale. The keys of the results are "case[scale]"."""
+    results = {}
+
+    for name in scales:
+        scale = fixtures.SCALES[name]
+
+        for case, func in cases(scale).items():
+            if only and case not in only:
+                continue
+
+            results[f"{case}[{name}]"] = time_case(func, repeat)
+            print(f"{case}[{name}]: {results[f'{case}[{name}]']:.4f}s", flush=True)
+
+    return results
+
+
+def compare(
+    results: dict[str, float], baselines: dict[str, float], tolerance: float
+) -> pd.DataFrame:
+    """Compare the results with the baselines. Cases without a baseline are kept,
+    but can't be regressions."""
+    return (
+        pd.DataFrame({"baseline": baselines, "current": results})
+        .dropna(subset=["current"])
+        .assign(
+            change=lambda d: d.current / d.baseline - 1,
+            regression=lambda d: d.change > tolerance,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scales", nargs="+", default=list(fixtures.SCALES), choices=fixtures.SCALES
+    )
+    parser.add_argument("--cases", nargs="+", help="Only run these cases")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", type=Path, help="Save the results as baselines")
+    parser.add_argument("--compare", type=Path, help="Compare with saved baselines")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.scales, repeat=args.repeat, only=args.cases)
+
+    if args.save:
+        args.save.write_text(json.dumps(results, indent=2, sort_keys=True))
+
+    if args.compare:
+        comparison = compare(
+            results, json.loads(args.compare.read_text()), args.tolerance
+        )
+        print(comparison.to_string(float_format="{:.4f}".format))
+
+        # Without any baseline, nothing could be a regression
+        if comparison.baseline.isna().all():
+            print("No baselines to compare with")
+            sys.exit(1)
+
+        if comparison.regression.any():
+            print(f"Regressions: {', '.join(comparison.index[comparison.regression])}")
+            sys.exit(1)
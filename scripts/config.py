@@ -6,5 +6,17 @@ class Paths:
 
     project = Path(__file__).resolve().parent.parent
     raw_data = project / "raw_data"
+    cache = raw_data / "cache"
     output = project / "output"
     scripts = project / "scripts"
+
+
+def set_bblocks_path(path: Path = Paths.raw_data) -> None:
+    """Set the folder where bblocks stores its data.
+
+    This is called when a pipeline starts, rather than when a module is imported.
+    bblocks is only imported here, so importing the config stays cheap.
+    """
+    from bblocks import set_bblocks_data_path
+
+    set_bblocks_data_path(path)
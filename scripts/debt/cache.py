@@ -0,0 +1,168 @@
+"""A content-addressed cache for the intermediate DataFrames of the debt pipeline.
+
+Cleaned and merged frames are stored as feather files, keyed by the function, its
+parameters, a hash of the source data files and a hash of the code which builds
+them (the debt modules and the versions of the packages they use). When the source
+data or the code changes, the key changes, so stale frames are never read. The least recently used frames are
+evicted when the cache grows beyond MAX_CACHE_SIZE.
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+import os
+from importlib import metadata
+from pathlib import Path
+
+import pandas as pd
+
+from scripts.config import Paths
+from scripts.logger import logger
+
+# Folder of the cached frames. Other caches (e.g. the WFP snapshot) are kept in
+# Paths.cache too, so only this folder is evicted or cleared.
+CACHE_FOLDER: Path = Paths.cache / "frames"
+
+# Maximum size of the cache folder, in bytes
+MAX_CACHE_SIZE: int = 500 * 1024**2
+
+# Column used to store the index of the cached frames
+INDEX_COLUMN: str = "__index__"
+
+# Packages whose version is part of the cache keys
+PACKAGES: tuple[str, ...] = ("pandas", "pyarrow", "bblocks", "country_converter")
+
+# Hashes of the source files, by path, size and modification time
+_file_hashes: dict = {}
+
+
+def source_files() -> list[Path]:
+    """The files from which the debt pipeline frames are built."""
+    files = sorted((Paths.raw_data / "ids_data").glob("*.feather"))
+    files.extend(sorted((Paths.raw_data / "ids_store").glob("*.feather")))
+    files.append(Paths.raw_data / "income_levels.csv")
+
+    return [file for file in files if file.exists()]
+
+
+def file_hash(path: Path) -> str:
+    """Hash the content of a file. The hash is only recomputed if the file changes."""
+    stat = path.stat()
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+
+    if key not in _file_hashes:
+        _file_hashes[key] = hashlib.sha256(path.read_bytes()).hexdigest()
+
+    return _file_hashes[key]
+
+
+@functools.lru_cache(maxsize=None)
+def code_hash() -> str:
+    """Hash the code which builds the frames: the debt modules, the name conversions
+    and the versions of the packages they use."""
+    key = hashlib.sha256()
+
+    files = sorted((Paths.scripts / "debt").glob("*.py"))
+    for file in [*files, Paths.scripts / "names.py"]:
+        key.update(file.name.encode())
+        key.update(file_hash(file).encode())
+
+    for package in PACKAGES:
+        key.update(f"{package}=={metadata.version(package)}".encode())
+
+    return key.hexdigest()
+
+
+def cache_key(name: str, params: dict) -> str:
+    """Create a key from the function name, its parameters, the source files and
+    the code."""
+    key = hashlib.sha256()
+    key.update(name.encode())
+    key.update(json.dumps(params, default=str).encode())
+    key.update(code_hash().encode())
+
+    for file in source_files():
+        key.update(file.name.encode())
+        key.update(file_hash(file).encode())
+
+    return key.hexdigest()
+
+
+def _read(path: Path) -> pd.DataFrame:
+    """Read a cached frame and mark it as recently used."""
+    os.utime(path)
+    return pd.read_feather(path).set_index(INDEX_COLUMN).rename_axis(None)
+
+
+def _write(df: pd.DataFrame, path: Path) -> None:
+    """Write a frame to the cache. The file is only visible once fully written."""
+    temp = path.with_suffix(f".{os.getpid()}.tmp")
+
+    try:
+        df.reset_index(names=INDEX_COLUMN).to_feather(temp)
+    except Exception:
+        temp.unlink(missing_ok=True)
+        raise
+
+    os.replace(temp, path)
+
+
+def _evict() -> None:
+    """Remove the least recently used frames until the cache fits MAX_CACHE_SIZE."""
+    files = sorted(CACHE_FOLDER.glob("*.feather"), key=lambda f: f.stat().st_mtime)
+    total = sum(f.stat().st_size for f in files)
+
+    while files and total > MAX_CACHE_SIZE:
+        oldest = files.pop(0)
+        total -= oldest.stat().st_size
+        oldest.unlink()
+
+
+def clear_cache() -> None:
+    """Remove all cached frames."""
+    for file in CACHE_FOLDER.glob("*.feather"):
+        file.unlink()
+
+
+def cached_frame(func):
+    """Cache the DataFrame returned by a pipeline function.
+
+    The function parameters must be JSON serialisable. If the function is called
+    with update_data=True, the cache is bypassed and the result is stored under
+    the key of the updated source data.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        params = signature.bind(*args, **kwargs)
+        params.apply_defaults()
+        params = dict(params.arguments)
+        update_data = params.pop("update_data", False)
+
+        path = CACHE_FOLDER / f"{cache_key(func.__qualname__, params)}.feather"
+
+        if path.exists() and not update_data:
+            logger.debug(f"Loaded {func.__name__} from cache")
+            return _read(path)
+
+        df = func(*args, **kwargs)
+
+        # The source data may have changed, so compute the key again
+        if update_data:
+            path = CACHE_FOLDER / f"{cache_key(func.__qualname__, params)}.feather"
+
+        CACHE_FOLDER.mkdir(parents=True, exist_ok=True)
+
+        try:
+            _write(df, path)
+        except (TypeError, ValueError) as e:
+            logger.debug(f"Could not cache {func.__name__}: {e}")
+            return df
+
+        _evict()
+
+        return df
+
+    return wrapper
@@ -1,16 +1,21 @@
 import pandas as pd
-from bblocks import DebtIDS, add_income_level_column, convert_id
+
+from scripts.debt.cache import cached_frame
+from scripts.debt.ids_store import read_ids
+from scripts.debt.schema import compact_frame
+from scripts.instrumentation import instrument
+from scripts.names import add_income_level_column_cached, convert_id_cached
 
 
 def _clean_counterpart_area(df: pd.DataFrame) -> pd.DataFrame:
     """Remove the non-breaking space from the counterpart_area column
     and harmomise the names of the counterpart areas (when possible)."""
     return df.assign(
-        counterpart_area=lambda d: d.counterpart_area.apply(
-            lambda r: r.replace("\xa0", "")
+        counterpart_area=lambda d: d.counterpart_area.str.replace(
+            "\xa0", "", regex=False
         )
     ).assign(
-        counterpart_area=lambda d: convert_id(
+        counterpart_area=lambda d: convert_id_cached(
             d["counterpart_area"], from_type="regex", to_type="name_short"
         )
     )
@@ -23,12 +28,28 @@ def _year2int(df: pd.DataFrame) -> pd.DataFrame:
 
 def _add_continent(df: pd.DataFrame) -> pd.DataFrame:
     return df.assign(
-        continent=lambda d: convert_id(
+        continent=lambda d: convert_id_cached(
             d.country, from_type="regex", to_type="continent"
         )
     )
 
 
+def _counterpart_series(indicators: dict, counterparts: dict) -> dict:
+    """Map each counterpart to the series code which matches its indicator type.
+
+    The indicators are a dictionary of series codes to indicator types
+    (e.g. "Bilateral"), and the counterparts a dictionary of counterpart
+    names to indicator types.
+    """
+    indicator_types = {v: k for k, v in indicators.items()}
+
+    return {
+        counterpart: indicator_types[indicator_type]
+        for counterpart, indicator_type in counterparts.items()
+    }
+
+
+@instrument("clean")
 def _clean_indicators(
     df: pd.DataFrame,
     filter_counterparts: bool = True,
@@ -44,7 +65,7 @@ def _clean_indicators(
 
     df = (
         df.pipe(_clean_counterpart_area)
-        .pipe(add_income_level_column, id_column="country", id_type="regex")
+        .pipe(add_income_level_column_cached, id_column="country")
         .pipe(_add_continent)
         .pipe(_year2int)
         .dropna(subset=["income_level"])
@@ -70,6 +91,7 @@ def _clean_indicators(
     return df.reset_index(drop=True)
 
 
+@cached_frame
 def get_clean_data(
     start_year,
     end_year,
@@ -78,24 +100,20 @@ def get_clean_data(
     counterparts: list | dict = None,
     update_data: bool = False,
 ) -> pd.DataFrame:
-    """Get indicator data for each country/counterpart_area pair."""
+    """Get indicator data for each country/counterpart_area pair.
+
+    The data has compact dtypes (see `scripts.debt.schema`).
+    """
 
     if counterparts is None and filter_counterparts:
         raise ValueError(
             "counterparts must be specified if filter_counterparts is True"
         )
 
-    # Create IDS object
-    ids = DebtIDS()
-
-    # Load data
-    ids.load_data(indicators=indicators, start_year=start_year, end_year=end_year)
-
-    if update_data:
-        ids.update_data(reload_data=True)
+    codes = [indicators] if isinstance(indicators, str) else list(indicators)
 
     # Get data and clean it
-    df = ids.get_data().pipe(
+    df = read_ids(codes, start_year, end_year, update_data=update_data).pipe(
         _clean_indicators,
         filter_counterparts=filter_counterparts,
         counterparts=list(counterparts),
@@ -104,14 +122,90 @@ def get_clean_data(
     if filter_counterparts:
         # Make sure only the right indicators are kept for each counterpart
         if isinstance(indicators, dict):
-            condition = ""
-            indicator_types = {v: k for k, v in indicators.items()}
-            for counterpart, indicator_type in counterparts.items():
-                condition += (
-                    f"(counterpart_area == '{counterpart}' and "
-                    f"series_code == '{indicator_types[indicator_type]}') or "
-                )
+            series = _counterpart_series(indicators, counterparts)
+            df = df.loc[
+                lambda d: d.series_code == d.counterpart_area.map(series)
+            ].reset_index(drop=True)
+
+    return df.drop(columns=["series_code"]).pipe(
+        compact_frame, value_codes={"value": codes}
+    )
+
+
+@instrument("merge")
+def get_clean_data_bundle(
+    start_year,
+    end_year,
+    indicators: dict[str, list | dict | str],
+    filter_counterparts: bool = False,
+    counterparts: list | dict = None,
+    update_data: bool = False,
+) -> pd.DataFrame:
+    """Get data for several indicators for each country/counterpart_area pair, as
+    a single wide DataFrame.
+
+    The indicators are passed as a dictionary of names to indicators (in any of the
+    formats accepted by `get_clean_data`). All series codes are loaded and cleaned
+    at once, and each indicator is returned as a "value_{name}" column.
+
+    The first indicator in the dictionary defines the rows of the data (as in a left
+    merge of the other indicators on to it). The data has compact dtypes.
+    """
+
+    if counterparts is None and filter_counterparts:
+        raise ValueError(
+            "counterparts must be specified if filter_counterparts is True"
+        )
 
-            df = df.query(condition[:-4]).reset_index(drop=True)
+    # Map each series code to the name of its indicator
+    codes = {
+        code: name
+        for name, indicator in indicators.items()
+        for code in ([indicator] if isinstance(indicator, str) else list(indicator))
+    }
 
-    return df.drop(columns=["series_code"])
+    # Get all the data at once and clean it
+    df = (
+        read_ids(list(codes), start_year, end_year, update_data=update_data)
+        .pipe(
+            _clean_indicators,
+            filter_counterparts=filter_counterparts,
+            counterparts=list(counterparts),
+        )
+        .assign(indicator=lambda d: d.series_code.map(codes))
+    )
+
+    if filter_counterparts:
+        # Make sure only the right indicators are kept for each counterpart
+        for name, indicator in indicators.items():
+            if isinstance(indicator, dict):
+                series = _counterpart_series(indicator, counterparts)
+                df = df.loc[
+                    lambda d: (d.indicator != name)
+                    | (d.series_code == d.counterpart_area.map(series))
+                ]
+
+    idx = ["country", "counterpart_area", "income_level", "continent", "year"]
+
+    # The rows of the first indicator, in their original order
+    rows = pd.MultiIndex.from_frame(
+        df.loc[lambda d: d.indicator == next(iter(indicators)), idx].drop_duplicates()
+    )
+
+    # Pivot the indicators into columns
+    return (
+        df.groupby(idx + ["indicator"], dropna=False)["value"]
+        .sum(min_count=1)
+        .unstack("indicator")
+        .reindex(index=rows, columns=list(indicators))
+        .add_prefix("value_")
+        .rename_axis(columns=None)
+        .reset_index()
+        .pipe(
+            compact_frame,
+            value_codes={
+                f"value_{name}": [c for c, n in codes.items() if n == name]
+                for name in indicators
+            },
+        )
+    )
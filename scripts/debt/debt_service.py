@@ -1,9 +1,9 @@
 import pandas as pd
 
 from scripts.config import Paths
-from bblocks import add_iso_codes_column, set_bblocks_data_path, DebtIDS
-
-set_bblocks_data_path(Paths.raw_data)
+from scripts.debt.ids_store import read_ids
+from scripts.instrumentation import instrument
+from bblocks import add_iso_codes_column, DebtIDS
 
 
 def update_debt_service(star_year: int, end_year: int) -> None:
@@ -12,15 +12,12 @@ def update_debt_service(star_year: int, end_year: int) -> None:
 
     service_indicators = ids.debt_service_indicators()
 
-    ids.load_data(
-        indicators=list(service_indicators), start_year=star_year, end_year=end_year
-    )
-
-    df = ids.get_data()
+    df = read_ids(list(service_indicators), start_year=star_year, end_year=end_year)
 
     df.to_feather(Paths.raw_data / "ids_service_raw.feather")
 
 
+@instrument("load")
 def read_debt_service() -> pd.DataFrame:
     """Read the debt service data"""
     return pd.read_feather(Paths.raw_data / "ids_service_raw.feather")
@@ -51,6 +48,7 @@ def _keep_valid_iso(df: pd.DataFrame) -> pd.DataFrame:
     return df.query("iso_code.str.len() == 3").reset_index(drop=True)
 
 
+@instrument("clean")
 def service_data() -> pd.DataFrame:
     return (
         read_debt_service()
@@ -0,0 +1,146 @@
+"""A consolidated store of the IDS data, with one partition per series code.
+
+bblocks saves one file per series code and year range, so the same data is stored
+(and downloaded) again for every range which is requested. Here, each series code is
+stored once, as an uncompressed feather file covering the widest range of years
+requested so far. The years covered are stored in the metadata of the file.
+
+Any range of years within the coverage of a partition is served by reading only the
+requested columns and years. Series codes which are missing, or which do not cover
+the requested years, are downloaded together in a single request.
+"""
+
+import os
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+from bblocks import DebtIDS
+
+from scripts.config import Paths
+from scripts.instrumentation import instrument
+from scripts.logger import logger
+
+STORE_FOLDER: Path = Paths.raw_data / "ids_store"
+
+
+def _partition_path(series_code: str) -> Path:
+    return STORE_FOLDER / f"{series_code}.feather"
+
+
+def _coverage(series_code: str) -> tuple[int, int] | None:
+    """The (start_year, end_year) covered by a partition, or None if it is missing."""
+    path = _partition_path(series_code)
+
+    if not path.exists():
+        return None
+
+    with pa.memory_map(str(path)) as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+
+    return int(metadata[b"start_year"]), int(metadata[b"end_year"])
+
+
+def _write_partition(df: pd.DataFrame, series_code: str, start_year, end_year) -> None:
+    """Write a partition. The file is only visible once fully written."""
+    STORE_FOLDER.mkdir(parents=True, exist_ok=True)
+    path = _partition_path(series_code)
+    temp = path.with_suffix(f".{os.getpid()}.tmp")
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    feather.write_feather(
+        table.replace_schema_metadata(
+            {"start_year": str(start_year), "end_year": str(end_year)}
+        ),
+        temp,
+        compression="uncompressed",
+    )
+
+    os.replace(temp, path)
+
+
+def _download(series_codes: list[str], start_year: int, end_year: int, update: bool):
+    """Download the series codes for the years, and store them as partitions."""
+    logger.debug(
+        f"Downloading {len(series_codes)} IDS series ({start_year}-{end_year})"
+    )
+
+    ids = DebtIDS()
+    ids.load_data(indicators=series_codes, start_year=start_year, end_year=end_year)
+
+    if update:
+        ids.update_data(reload_data=True)
+
+    df = ids.get_data()
+
+    for code in series_codes:
+        _write_partition(
+            df.loc[lambda d: d.series_code == code].reset_index(drop=True),
+            code,
+            start_year,
+            end_year,
+        )
+
+
+def update_store(
+    series_codes: list[str], start_year: int, end_year: int, update: bool = False
+) -> None:
+    """Make sure that the store covers the series codes for the years.
+
+    The series codes which are missing or do not cover the years are downloaded in a
+    single request, for the widest range of years needed. If update is True, all the
+    series codes are downloaded again.
+    """
+    series_codes = list(dict.fromkeys(series_codes))
+    coverage = {code: _coverage(code) for code in series_codes}
+
+    missing = [
+        code
+        for code, years in coverage.items()
+        if update or years is None or years[0] > start_year or years[1] < end_year
+    ]
+
+    if len(missing) == 0:
+        return
+
+    # Extend the years to the coverage of the partitions which will be replaced
+    covered = [coverage[code] for code in missing if coverage[code] is not None]
+    start_year = min([start_year] + [start for start, _ in covered])
+    end_year = max([end_year] + [end for _, end in covered])
+
+    _download(missing, start_year, end_year, update)
+
+
+@instrument("load")
+def read_ids(
+    series_codes: list[str] | str,
+    start_year: int,
+    end_year: int,
+    columns: list[str] | None = None,
+    update_data: bool = False,
+) -> pd.DataFrame:
+    """Read the IDS data for the series codes and years (inclusive), in the format
+    returned by bblocks' `DebtIDS.get_data`.
+
+    Only the requested columns (all if None) and years are read from the store.
+    Data which is not in the store yet is downloaded first.
+    """
+    if isinstance(series_codes, str):
+        series_codes = [series_codes]
+
+    update_store(series_codes, start_year, end_year, update=update_data)
+
+    dataset = ds.dataset(
+        [str(_partition_path(code)) for code in dict.fromkeys(series_codes)],
+        format="feather",
+    )
+
+    year_type = dataset.schema.field("year").type
+    years = (
+        ds.field("year") >= pa.scalar(datetime(start_year, 1, 1), type=year_type)
+    ) & (ds.field("year") <= pa.scalar(datetime(end_year, 12, 31), type=year_type))
+
+    return dataset.to_table(columns=columns, filter=years).to_pandas()
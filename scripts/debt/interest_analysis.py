@@ -1,17 +1,17 @@
+import numpy as np
 import pandas as pd
-from bblocks import add_iso_codes_column, set_bblocks_data_path
+from bblocks import add_iso_codes_column
 
-from scripts.config import Paths
-from scripts.debt.clean_data import get_clean_data
+from scripts.debt.cache import cached_frame
+from scripts.debt.clean_data import get_clean_data, get_clean_data_bundle
+from scripts.debt.schema import keys_as_strings
 from scripts.debt.tools import (
-    add_weights,
-    calculate_interest_payments,
+    calculate_interest_payments_batch,
     compute_grouping_stats,
-    compute_weighted_averages,
-    keep_market_access_only,
+    market_access_mask,
+    weighted_group_averages,
 )
-
-set_bblocks_data_path(Paths.raw_data)
+from scripts.instrumentation import instrument
 
 INTEREST_RATE_INDICATOR: str = "DT.INR.DPPG"
 MATURITY_INDICATOR: str = "DT.MAT.DPPG"
@@ -32,6 +32,15 @@ COMMITMENTS_INDICATORS = {
 }
 
 
+# Value columns of the merged loans data
+LOAN_COLUMNS: list = [
+    "value_commitments",
+    "value_rate",
+    "value_grace",
+    "value_maturities",
+]
+
+
 def study_counterparts() -> dict:
     """The list of counterparts to keep for the analysis"""
     return {
@@ -129,16 +138,16 @@ def get_grace(
     )
 
 
+@cached_frame
 def get_merged_rates_commitments_payments_data(
     start_year: int, end_year: int, filter_counterparts: bool = True
 ) -> pd.DataFrame:
-    """Get the data with the interest rate, the commitments, the grace period and the maturities.
+    """Get the data with the interest rate, the commitments and the interest payments.
 
     the resulting data identifies:
     - interest rates as "value_rate"
     - commitments as "value_commitments"
-    - grace period as "value_grace"
-    - maturities as "value_maturities"
+    - interest payments as "value_payments"
 
     The data is merged on the following columns:
     - country
@@ -149,23 +158,23 @@ def get_merged_rates_commitments_payments_data(
 
     """
 
-    rate = get_average_interest(start_year, end_year, filter_counterparts)
-    commitments = get_commitments(start_year, end_year, filter_counterparts)
-    payments = get_interest_payments(start_year, end_year, filter_counterparts)
-
-    idx = ["year", "country", "counterpart_area", "continent", "income_level"]
-
-    # merge the data and keep only rows with positive commitments
-    df = (
-        pd.merge(commitments, rate, on=idx, how="left", suffixes=("_commitments", ""))
-        .merge(payments, on=idx, how="left", suffixes=("", "_payments"))
-        .rename(columns={"value": "value_rate"})
-        .loc[lambda d: d.value_commitments > 0]
-    )
+    # Load all the indicators at once, and keep only rows with positive commitments
+    df = get_clean_data_bundle(
+        start_year=start_year,
+        end_year=end_year,
+        indicators={
+            "commitments": COMMITMENTS_INDICATORS,
+            "rate": INTEREST_RATE_INDICATOR,
+            "payments": INTEREST_PAYMENTS_INDICATORS,
+        },
+        filter_counterparts=filter_counterparts,
+        counterparts=study_counterparts(),
+    ).loc[lambda d: d.value_commitments > 0]
 
     return df
 
 
+@cached_frame
 def get_merged_rates_commitments_grace_maturities_data(
     start_year: int,
     end_year: int,
@@ -189,27 +198,67 @@ def get_merged_rates_commitments_grace_maturities_data(
 
     """
 
-    rate = get_average_interest(start_year, end_year, filter_counterparts, update_data)
-    commitments = get_commitments(
-        start_year, end_year, filter_counterparts, update_data
-    )
-    grace = get_grace(start_year, end_year, filter_counterparts, update_data)
-    maturities = get_maturities(start_year, end_year, filter_counterparts, update_data)
-
-    idx = ["year", "country", "counterpart_area", "continent", "income_level"]
-
-    # merge the data and keep only rows with positive commitments
-    df = (
-        pd.merge(commitments, rate, on=idx, how="left", suffixes=("_commitments", ""))
-        .merge(grace, on=idx, how="left", suffixes=("", "_grace"))
-        .merge(maturities, on=idx, how="left", suffixes=("", "_maturities"))
-        .rename(columns={"value": "value_rate"})
-        .loc[lambda d: d.value_commitments > 0]
-    )
+    # Load all the indicators at once, and keep only rows with positive commitments
+    df = get_clean_data_bundle(
+        start_year=start_year,
+        end_year=end_year,
+        indicators={
+            "commitments": COMMITMENTS_INDICATORS,
+            "rate": INTEREST_RATE_INDICATOR,
+            "grace": GRACE_PERIOD_INDICATOR,
+            "maturities": MATURITY_INDICATOR,
+        },
+        filter_counterparts=filter_counterparts,
+        counterparts=study_counterparts(),
+        update_data=update_data,
+    ).loc[lambda d: d.value_commitments > 0]
 
     return df
 
 
+@instrument("clean")
+def _get_loans_data(
+    start_year: int,
+    end_year: int,
+    *,
+    filter_counterparts: bool = True,
+    filter_countries: bool = False,
+    filter_type: str = None,
+    filter_values: list[str] = None,
+    market_access_only: bool = False,
+    columns: list[str] | None = None,
+    update_data: bool = False,
+) -> pd.DataFrame:
+    """Get the merged loans data (rates, commitments, grace and maturities),
+    optionally filtered to a group of debtors and to countries with market access.
+
+    The filters are combined into a single mask, so the data is only copied once.
+    If columns are specified, only those columns are kept.
+    """
+
+    df = get_merged_rates_commitments_grace_maturities_data(
+        start_year=start_year,
+        end_year=end_year,
+        filter_counterparts=filter_counterparts,
+        update_data=update_data,
+    )
+
+    mask = np.ones(len(df), dtype=bool)
+
+    if filter_countries:
+        mask &= df[filter_type].isin(filter_values).to_numpy()
+    if market_access_only:
+        mask &= market_access_mask(df)
+
+    if columns is None:
+        columns = list(df.columns)
+
+    if mask.all() and len(columns) == len(df.columns):
+        return df
+
+    return df.loc[mask, columns]
+
+
 def expected_payments_on_new_debt(
     start_year: int = 2000,
     end_year: int = 2021,
@@ -278,27 +327,36 @@ def expected_payments_on_new_debt(
     # Create empty df for grouped data in case it is needed
     group_tot = pd.DataFrame()
 
-    # Get the data
-    df = get_merged_rates_commitments_grace_maturities_data(
+    # Get the data, keeping only the columns which are needed
+    df = _get_loans_data(
         start_year=start_year,
         end_year=end_year,
         filter_counterparts=filter_counterparts,
+        filter_countries=filter_countries,
+        filter_type=filter_type,
+        filter_values=filter_values,
+        market_access_only=market_access_only,
+        columns=list(
+            dict.fromkeys(
+                weights_idx
+                + ["year", "counterpart_area"]
+                + ([filter_type] if add_aggregate else [])
+                + LOAN_COLUMNS
+            )
+        ),
         update_data=update_data,
     )
 
-    if filter_countries:
-        df = df.loc[lambda d: d[filter_type].isin(filter_values)].reset_index(drop=True)
-    if market_access_only:
-        df = keep_market_access_only(df)
-
     # Add expected payments
     df = df.assign(
-        expected_payments=df.apply(
-            calculate_interest_payments,
+        expected_payments=calculate_interest_payments_batch(
+            commitments=df.value_commitments.to_numpy(),
+            rate=df.value_rate.to_numpy(),
+            grace=df.value_grace.to_numpy(),
+            maturities=df.value_maturities.to_numpy(),
             discount_rate=discount_rate,
             new_rate=new_interest_rate,
             rate_difference=interest_rate_difference,
-            axis=1,
         )
     )
 
@@ -309,22 +367,126 @@ def expected_payments_on_new_debt(
             filter_type=filter_type,
             filter_values=filter_values,
             group_name=aggregate_name,
-        ).drop(columns=["value_rate", "value_grace", "value_maturities"])
+            sum_columns=["value_commitments", "expected_payments"],
+        )
 
     if only_aggregate:
         return group_tot
 
-    # Add weights to individual countries
-    df = add_weights(df, idx=weights_idx, value_column="value_commitments")
-
-    # Compute weighted average
-    df = compute_weighted_averages(df, idx=weights_idx)
+    # Compute weighted averages, with weights based on commitments
+    df = weighted_group_averages(
+        df,
+        idx=weights_idx,
+        weight_column="value_commitments",
+        sum_columns=[
+            "value_commitments",
+            "value_rate",
+            "value_grace",
+            "value_maturities",
+            "expected_payments",
+        ],
+    )
 
     df = pd.concat([group_tot, df], ignore_index=True)
 
     return df
 
 
+def expected_payments_rate_scenarios(
+    start_year: int = 2000,
+    end_year: int = 2021,
+    discount_rate: float = 0.0,
+    new_interest_rates: list[float] | None = None,
+    interest_rate_differences: list[float] | None = None,
+    *,
+    include_actual: bool = True,
+    filter_counterparts: bool = True,
+    filter_countries: bool = False,
+    filter_type: str = None,
+    filter_values: str | list[str] = None,
+    market_access_only: bool = False,
+    update_data: bool = False,
+) -> pd.DataFrame:
+    """Compute the expected interest payments on new debt under many interest rate scenarios.
+
+    The data is loaded and merged only once. The expected payments for every scenario
+    are then computed in a single (scenarios x loans) pass.
+
+    Each value in new_interest_rates is a scenario in which every loan is priced at that
+    (fixed) interest rate. Each value in interest_rate_differences is a scenario in which
+    the difference is added to (or subtracted from) the actual interest rate. Both are
+    expressed as percentages. If include_actual is True, a scenario at the actual
+    interest rate is also included.
+
+    The filtering parameters work as in `expected_payments_on_new_debt`.
+
+    The result is a long DataFrame with one row per scenario, country, counterpart_area
+    and year. The scenario is identified by the "scenario", "new_interest_rate" and
+    "interest_rate_difference" columns. The rate used for each scenario is stored as
+    "scenario_rate".
+    """
+    # validate filter values
+    if isinstance(filter_values, str):
+        filter_values = [filter_values]
+
+    # Build the scenarios. A missing new rate means the actual rate is used.
+    scenarios = [{"scenario": "actual"}] if include_actual else []
+    scenarios += [
+        {"scenario": f"rate {r}%", "new_interest_rate": r}
+        for r in new_interest_rates or []
+    ]
+    scenarios += [
+        {"scenario": f"actual {d:+}pp", "interest_rate_difference": d}
+        for d in interest_rate_differences or []
+    ]
+    scenarios = pd.DataFrame(
+        scenarios,
+        columns=["scenario", "new_interest_rate", "interest_rate_difference"],
+    ).astype({"new_interest_rate": "float64", "interest_rate_difference": "float64"})
+
+    if scenarios.empty:
+        raise ValueError("At least one interest rate scenario must be provided")
+
+    # Get the data
+    df = _get_loans_data(
+        start_year=start_year,
+        end_year=end_year,
+        filter_counterparts=filter_counterparts,
+        filter_countries=filter_countries,
+        filter_type=filter_type,
+        filter_values=filter_values,
+        market_access_only=market_access_only,
+        update_data=update_data,
+    )
+
+    # Build a (scenarios x loans) matrix of interest rates
+    new_rates = scenarios.new_interest_rate.to_numpy()[:, None]
+    differences = scenarios.interest_rate_difference.fillna(0).to_numpy()[:, None]
+    rates = (
+        np.where(np.isnan(new_rates), df.value_rate.to_numpy()[None, :], new_rates)
+        + differences
+    )
+
+    # Compute the expected payments for all scenarios at once
+    payments = calculate_interest_payments_batch(
+        commitments=df.value_commitments.to_numpy(),
+        rate=rates,
+        grace=df.value_grace.to_numpy(),
+        maturities=df.value_maturities.to_numpy(),
+        discount_rate=discount_rate,
+    )
+
+    # Reshape to a long DataFrame
+    n_scenarios, n_loans = rates.shape
+    result = df.iloc[np.tile(np.arange(n_loans), n_scenarios)].reset_index(drop=True)
+    scenario_data = scenarios.iloc[np.repeat(np.arange(n_scenarios), n_loans)]
+
+    return pd.concat([scenario_data.reset_index(drop=True), result], axis=1).assign(
+        scenario_rate=rates.ravel(),
+        expected_payments=payments.ravel(),
+    )
+
+
 def expected_payment_single_counterpart(
     start_year: int,
     end_year: int,
@@ -360,6 +522,7 @@ def expected_payment_single_counterpart(
             market_access_only=market_access_only,
             update_data=update_data,
         )
+        .pipe(keys_as_strings, columns=["country"])
         .pipe(add_iso_codes_column, id_column="country", id_type="regex")
         .loc[lambda d: d.counterpart_area.isin([counterpart])]
         .assign(expected_payments=lambda d: round(d.expected_payments / 1e9, 3))
@@ -379,58 +542,86 @@ def counterpart_difference(
     """Helper function to get the difference in expected payments for a single
     counterpart at a new interest rate and the current interest rate.
 
+    The new interest rate for each year is the (weighted) average rate of the
+    comparison counterpart for the same group and year.
+
     The output is a long dataframe which has the selected counterpart at the
     original interest rate and at the new interest rate.
 
+    The data is loaded only once. The comparison rates are computed for all years,
+    and the main counterpart's commitments are then re-priced in a single pass.
     """
+    # validate filter values
+    if isinstance(filter_values, str):
+        filter_values = [filter_values]
 
-    # Get the actual expected payments
-    actual = expected_payment_single_counterpart(
+    # Get the data and the actual expected payments
+    loans = _get_loans_data(
         start_year=start_year,
         end_year=end_year,
-        counterpart=main_counterpart,
-        discount_rate=0.05,
+        filter_countries=True,
         filter_type=filter_type,
         filter_values=filter_values,
-        aggregate_name=aggregate_name,
-        market_access_only=False,
         update_data=update_data,
     )
 
+    loans = loans.assign(
+        expected_payments=calculate_interest_payments_batch(
+            commitments=loans.value_commitments.to_numpy(),
+            rate=loans.value_rate.to_numpy(),
+            grace=loans.value_grace.to_numpy(),
+            maturities=loans.value_maturities.to_numpy(),
+            discount_rate=0.05,
+        )
+    )
+
+    # Compute the group averages and totals for all counterparts and years
+    group_tot = (
+        compute_grouping_stats(
+            df=loans,
+            filter_type=filter_type,
+            filter_values=filter_values,
+            group_name=aggregate_name,
+            sum_columns=["value_commitments", "expected_payments"],
+        )
+        .pipe(add_iso_codes_column, id_column="country", id_type="regex")
+        .assign(expected_payments=lambda d: round(d.expected_payments / 1e9, 3))
+    )
+
     # Get the rates for the comparison counterpart for the same years
-    comparison = expected_payment_single_counterpart(
-        start_year=start_year,
-        end_year=end_year,
-        counterpart=comparison_counterpart,
-        discount_rate=0.05,
-        filter_type=filter_type,
-        filter_values=filter_values,
-        aggregate_name=aggregate_name,
-        market_access_only=False,
-    ).filter(["year", "avg_rate"])
+    comparison = group_tot.loc[
+        lambda d: d.counterpart_area == comparison_counterpart
+    ].filter(["year", "avg_rate"])
 
-    # Merge the two dataframes
-    actual = actual.merge(
+    # Merge the comparison rates to the main counterpart's expected payments
+    actual = group_tot.loc[lambda d: d.counterpart_area == main_counterpart].merge(
         comparison, on="year", how="left", suffixes=("", "_comparison")
     )
 
-    # Calculate the expected payments at the new rate
-    with_new_expected = actual.assign(
-        expected_payments_at_new_rate=lambda d: d.apply(
-            lambda r: expected_payment_single_counterpart(
-                start_year=start_year,
-                end_year=end_year,
-                counterpart=main_counterpart,
-                new_interest_rate=r.avg_rate_comparison,
+    # Re-price the main counterpart's commitments at each year's comparison rate
+    main = loans.loc[lambda d: d.counterpart_area == main_counterpart]
+
+    payments_at_new_rate = (
+        main.assign(
+            expected_payments=calculate_interest_payments_batch(
+                commitments=main.value_commitments.to_numpy(),
+                rate=main.value_rate.to_numpy(),
+                grace=main.value_grace.to_numpy(),
+                maturities=main.value_maturities.to_numpy(),
                 discount_rate=0.05,
-                filter_type=filter_type,
-                filter_values=filter_values,
-                aggregate_name=aggregate_name,
-                market_access_only=False,
+                new_rate=main.year.map(
+                    comparison.set_index("year").avg_rate
+                ).to_numpy(),
             )
-            .loc[lambda result: result.year == r.year, "expected_payments"]
-            .values[0],
-            axis=1,
+        )
+        .groupby("year")
+        .expected_payments.sum()
+    )
+
+    # Calculate the expected payments at the new rate
+    with_new_expected = actual.assign(
+        expected_payments_at_new_rate=lambda d: round(
+            d.year.map(payments_at_new_rate) / 1e9, 3
         )
     )
 
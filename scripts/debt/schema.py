@@ -0,0 +1,137 @@
+"""Compact dtypes for the cleaned IDS frames.
+
+The key columns (country, counterpart_area, etc.) are stored as categoricals, the
+year as int16, and the values of indicators which are not in current US dollars
+(rates, grace periods and maturities) as float32.
+
+All frames share a vocabulary for each key column, which grows as new values are
+seen. Frames which are cast to the same vocabulary can be merged and concatenated
+without losing their categorical dtypes. Frames created (or cached) at different
+times can be brought back to the same vocabulary with `align_categories`.
+"""
+
+import threading
+
+import pandas as pd
+from pandas.core.groupby import DataFrameGroupBy
+
+KEY_COLUMNS: tuple = (
+    "country",
+    "counterpart_area",
+    "income_level",
+    "continent",
+    "series_code",
+)
+
+_lock = threading.Lock()
+_vocabularies: dict[str, list] = {}
+
+
+def key_dtype(column: str, values=()) -> pd.CategoricalDtype:
+    """The categorical dtype of a key column, after adding the values to its
+    vocabulary. The categories are sorted, so that sorting by a key column gives the
+    same order as sorting the strings."""
+    new = {str(value) for value in pd.Series(values, dtype="object").dropna()}
+
+    with _lock:
+        vocabulary = _vocabularies.setdefault(column, [])
+
+        if not new.issubset(vocabulary):
+            vocabulary[:] = sorted(new.union(vocabulary))
+
+        return pd.CategoricalDtype(list(vocabulary))
+
+
+def value_dtype(series_codes: list[str]) -> str:
+    """The dtype of the values of the series codes. Amounts in current US dollars
+    (".CD" codes) need float64. Rates, grace periods and maturities fit float32."""
+    if any(code.endswith(".CD") for code in series_codes):
+        return "float64"
+
+    return "float32"
+
+
+def compact_frame(df: pd.DataFrame, value_codes: dict | None = None) -> pd.DataFrame:
+    """Cast a cleaned IDS frame to compact dtypes.
+
+    The value_codes dictionary maps each value column to the series codes it holds,
+    to choose its dtype with `value_dtype`. Value columns which are not in the
+    dictionary are not changed.
+    """
+    dtypes = {
+        column: key_dtype(column, df[column].unique())
+        for column in KEY_COLUMNS
+        if column in df.columns
+    }
+
+    if "year" in df.columns and pd.api.types.is_numeric_dtype(df.year):
+        dtypes["year"] = "int16" if df.year.notna().all() else "Int16"
+
+    dtypes.update(
+        {
+            column: value_dtype(codes)
+            for column, codes in (value_codes or {}).items()
+            if column in df.columns
+        }
+    )
+
+    return df.astype(dtypes)
+
+
+def align_categories(*frames: pd.DataFrame) -> list[pd.DataFrame]:
+    """Cast the key columns of the frames to the same (shared) vocabulary."""
+    for df in frames:
+        for column in KEY_COLUMNS:
+            if column in df.columns:
+                key_dtype(column, df[column].unique())
+
+    return [
+        df.astype(
+            {
+                column: key_dtype(column)
+                for column in KEY_COLUMNS
+                if column in df.columns
+            }
+        )
+        for df in frames
+    ]
+
+
+def keys_as_strings(df: pd.DataFrame, columns: list[str] | None = None) -> pd.DataFrame:
+    """Cast categorical key columns back to strings (object dtype).
+
+    This is needed before passing the frames to functions which fill or replace
+    values with new strings, like bblocks' `add_iso_codes_column`.
+    """
+    if columns is None:
+        columns = list(KEY_COLUMNS)
+
+    return df.astype(
+        {
+            column: "object"
+            for column in columns
+            if column in df.columns
+            and isinstance(df[column].dtype, pd.CategoricalDtype)
+        }
+    )
+
+
+def group_by_keys(df: pd.DataFrame, idx: list[str]) -> DataFrameGroupBy:
+    """Group a frame by the idx columns, with the rows with missing keys in groups of
+    their own (as with dropna=False and observed=True).
+
+    pandas 1.5 drops the groups of missing categorical keys even with dropna=False,
+    and numbers their rows NaN in `ngroup`. So categorical keys with missing values
+    are grouped as objects. Their categories are sorted, so the order of the groups
+    is the same. The keys of the result can be cast back with `df[idx].dtypes`.
+    """
+    missing = [
+        column
+        for column in idx
+        if isinstance(df[column].dtype, pd.CategoricalDtype) and df[column].isna().any()
+    ]
+
+    if missing:
+        df = df.astype({column: "object" for column in missing})
+
+    return df.groupby(idx, dropna=False, observed=True)
@@ -4,6 +4,9 @@ import pandas as pd
 
 import logging
 
+from scripts.debt.schema import group_by_keys
+from scripts.instrumentation import instrument
+
 logging.getLogger("country_converter").setLevel(logging.ERROR)
 
 
@@ -28,7 +31,7 @@ def order_income(
         order = [True, False, True, True, False]
 
     return (
-        df.assign(order=lambda d: d.income_level.map(income_order))
+        df.assign(order=lambda d: d.income_level.astype("object").map(income_order))
         .sort_values(idx, ascending=order)
         .drop(columns=["order"])
         .reset_index(drop=True)
@@ -60,9 +63,7 @@ def add_weights(
 
     # Calculate the weights
     df = df.assign(
-        weight=lambda d: d.groupby(idx, group_keys=False)[value_column].transform(
-            lambda r: r / r.sum()
-        )
+        weight=lambda d: d[value_column] / d.groupby(idx)[value_column].transform("sum")
     )
 
     return df
@@ -143,6 +144,104 @@ def calculate_interest_payments(
     return total_interest
 
 
+def _discounted_sums(years: np.ndarray, discount_rate: float) -> tuple:
+    """Closed-form sums of the discount factors over years 1..n.
+
+    Returns sum(v^k) and sum(k * v^k) for k in 1..n, where v = 1 / (1 + discount_rate).
+    With no discount, these are simply n and n(n+1)/2.
+    """
+    if discount_rate == 0:
+        return years, years * (years + 1) / 2
+
+    v = 1 / (1 + discount_rate)
+    v_n = v**years
+
+    # Geometric series and its derivative (arithmetic-geometric series)
+    annuity = (1 - v_n) / discount_rate
+    weighted_annuity = v * (1 - (years + 1) * v_n + years * v_n * v) / (1 - v) ** 2
+
+    return annuity, weighted_annuity
+
+
+@instrument("npv")
+def calculate_interest_payments_batch(
+    commitments: np.ndarray,
+    rate: np.ndarray,
+    grace: np.ndarray,
+    maturities: np.ndarray,
+    discount_rate: float = 0.0,
+    new_rate: float | np.ndarray = None,
+    rate_difference: float | np.ndarray = None,
+) -> np.ndarray:
+    """Calculate the NPV of the interest payments for arrays of loans in one pass.
+
+    This is the vectorised equivalent of `calculate_interest_payments`. The arrays
+    correspond to the following columns of the merged data:
+
+    - value_commitments.
+    - value_rate.
+    - value_grace.
+    - value_maturities.
+
+    Instead of looping over the years of each loan, the NPV is computed using
+    closed-form annuity formulas:
+    - interest during grace is paid for floor(grace) years on the full commitment.
+    - interest after grace is paid for ceil(maturities - grace) - 1 years on the
+      outstanding (linearly amortised) principal.
+
+    The new_rate and rate_difference can be scalars or arrays which broadcast
+    against the loan arrays. Loans with missing grace or maturities return NaN.
+    """
+    commitments = np.asarray(commitments, dtype="float64")
+    grace = np.asarray(grace, dtype="float64")
+    maturities = np.asarray(maturities, dtype="float64")
+
+    if new_rate is not None:
+        rate = np.broadcast_to(np.asarray(new_rate, dtype="float64"), np.shape(rate))
+
+    rate = np.asarray(rate, dtype="float64")
+
+    if rate_difference is not None:
+        rate = rate + np.asarray(rate_difference, dtype="float64")
+
+    # Since the rate is given in percentage points, we need to divide by 100
+    rate = rate / 100
+
+    # Calculate the number of years in which principal will be paid
+    payment_years = maturities - grace
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Calculate the principal payment per year
+        principal_payment_per_year = np.where(
+            payment_years <= 0, 0.0, commitments / payment_years
+        )
+
+        # Number of years with interest payments during and after grace
+        grace_years = np.maximum(np.floor(grace), 0)
+        amortisation_years = np.maximum(np.ceil(payment_years) - 1, 0)
+
+        # Interests during grace period, discounted to present value
+        grace_annuity, _ = _discounted_sums(grace_years, discount_rate)
+        grace_period_interest = np.where(
+            grace_years > 0, commitments * rate * grace_annuity, 0.0
+        )
+
+        # Interests after grace, on the outstanding principal of each year
+        annuity, weighted_annuity = _discounted_sums(amortisation_years, discount_rate)
+        loan_interests_after_grace = np.where(
+            amortisation_years > 0,
+            rate
+            * (commitments * annuity - principal_payment_per_year * weighted_annuity)
+            / (1 + discount_rate) ** grace,
+            0.0,
+        )
+
+    total_interest = grace_period_interest + loan_interests_after_grace
+
+    # Loans without grace or maturity information cannot be valued
+    return np.where(np.isnan(payment_years), np.nan, total_interest)
+
+
 def compute_weighted_averages(
     df: pd.DataFrame, idx: list = None, value_columns: list = None
 ) -> pd.DataFrame:
@@ -162,8 +261,9 @@ def compute_weighted_averages(
         value_columns = ["value_rate", "value_maturities", "value_grace"]
 
     # Compute weighted average and group by index
-    for col in value_columns:
-        df[f"avg_{col.split('_')[1]}"] = df[col] * df.weight
+    df = df.assign(
+        **{f"avg_{col.split('_')[1]}": df[col] * df.weight for col in value_columns}
+    )
 
     # Compute weighted average and group by index
     df = df.groupby(idx, as_index=False, dropna=False, observed=True).sum(
@@ -173,6 +273,78 @@ def compute_weighted_averages(
     return df
 
 
+@instrument("aggregate")
+def weighted_group_averages(
+    df: pd.DataFrame,
+    idx: list = None,
+    value_columns: list = None,
+    weight_column: str = "value_commitments",
+    sum_columns: list = None,
+) -> pd.DataFrame:
+    """Compute the weighted average of the value_columns for each group defined by idx.
+
+    This is equivalent to `add_weights` followed by `compute_weighted_averages`, but
+    the weights and averages are computed in a single vectorised pass, without
+    modifying the original DataFrame.
+
+    For each group, the average is sum(w * x) / sum(w), where w is the weight_column.
+    Rows with a missing weight are ignored. Rows with a missing value still count
+    towards the total weight of the group (as in `compute_weighted_averages`).
+
+    The result contains the idx columns, the sum of each of the sum_columns (by default
+    only the weight_column), a "weight" column with the sum of the weight shares, and
+    an "avg_" column for each of the value_columns.
+    """
+
+    # Set default value for idx
+    if idx is None:
+        idx = ["year", "country", "counterpart_area"]
+
+    # Set default value for value_columns
+    if value_columns is None:
+        value_columns = ["value_rate", "value_maturities", "value_grace"]
+
+    # Set default value for sum_columns
+    if sum_columns is None:
+        sum_columns = [weight_column]
+
+    # Rows with missing keys are kept in groups of their own
+    groups = group_by_keys(df, idx)
+
+    # Group number of each row. Groups are numbered in the same (sorted) order
+    # as the result of the groupby.
+    codes = groups.ngroup().to_numpy()
+    n_groups = groups.ngroups
+
+    # Compute the share of each row in the total weight of its group
+    weights = df[weight_column].to_numpy(dtype="float64")
+    totals = np.bincount(codes, weights=np.nan_to_num(weights), minlength=n_groups)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        shares = weights / totals[codes]
+
+    # Add up the columns to keep for each group
+    result = groups[sum_columns].sum() if sum_columns else groups.size().to_frame()
+
+    # Compute the weighted averages
+    result = result.filter(sum_columns).assign(
+        weight=np.bincount(codes, weights=np.nan_to_num(shares), minlength=n_groups),
+        **{
+            f"avg_{col.split('_')[1]}": np.bincount(
+                codes,
+                weights=np.nan_to_num(df[col].to_numpy(dtype="float64") * shares),
+                minlength=n_groups,
+            )
+            for col in value_columns
+        },
+    )
+
+    # With categorical keys, some versions of pandas return the groups in the order
+    # in which they appear. Sort them, as for other keys.
+    return result.sort_index().reset_index().astype(df[idx].dtypes.to_dict())
+
+
+@instrument("aggregate")
 def compute_grouping_stats(
     df: pd.DataFrame,
     filter_type: str,
@@ -180,6 +352,7 @@ def compute_grouping_stats(
     group_name: str,
     idx: list = None,
     value_columns: list = None,
+    sum_columns: list = None,
 ) -> pd.DataFrame:
     """Compute the weighted averages for a group of countries.
 
@@ -193,6 +366,8 @@ def compute_grouping_stats(
 
     The idx parameter is the list of columns to use to group the data.
     The value_columns parameter is the list of columns to compute the weighted averages on.
+    The sum_columns parameter is the list of columns to add up for the group. By default,
+    all numeric columns are added up.
     """
 
     if filter_type not in ["continent", "income_level", "country"]:
@@ -201,18 +376,33 @@ def compute_grouping_stats(
     if idx is None:
         idx = ["year", "counterpart_area"]
 
-    # Create a copy of the data
-    group_data = df.copy(deep=True)
-
-    # filter the data to keep only the relevant data for the group
-    group_data = group_data.loc[lambda d: d[filter_type].isin(filter_values)]
-
-    # Compute the weights based on commitments
-    group_data = add_weights(group_data, idx=idx, value_column="value_commitments")
+    if value_columns is None:
+        value_columns = ["value_rate", "value_maturities", "value_grace"]
 
-    # Compute the weighted averages
-    group_data = compute_weighted_averages(
-        group_data, idx=idx, value_columns=value_columns
+    if sum_columns is None:
+        sum_columns = [
+            c
+            for c, dtype in df.dtypes.items()
+            if pd.api.types.is_numeric_dtype(dtype) and c not in idx and c != "weight"
+        ]
+
+    # Keep only the rows of the group, and only the columns which are needed
+    columns = [
+        c
+        for c in dict.fromkeys(
+            idx + value_columns + sum_columns + ["value_commitments"]
+        )
+        if c in df.columns
+    ]
+    group_data = df.loc[df[filter_type].isin(filter_values).to_numpy(), columns]
+
+    # Compute the weighted averages, with weights based on commitments
+    group_data = weighted_group_averages(
+        group_data,
+        idx=idx,
+        value_columns=value_columns,
+        weight_column="value_commitments",
+        sum_columns=sum_columns,
     )
 
     # Add the group name
@@ -221,13 +411,17 @@ def compute_grouping_stats(
     return group_data
 
 
+def market_access_mask(df: pd.DataFrame) -> np.ndarray:
+    """Flag the rows of countries with market access (with commitments from
+    bondholders)"""
+    bonds = (df.counterpart_area == "Bondholders") & df.value_commitments.notna()
+
+    return df.country.isin(df.country[bonds].unique()).to_numpy()
+
+
 def keep_market_access_only(df: pd.DataFrame) -> pd.DataFrame:
     """Filter out countries without market access"""
     # Keep only countries with market access
-    market_countries = df.query(
-        "counterpart_area == 'Bondholders' and value_commitments.notna()"
-    ).country.unique()
-
-    df = df.loc[lambda d: d.country.isin(market_countries)]
+    df = df.loc[market_access_mask(df)]
 
     return df.reset_index(drop=True)
@@ -0,0 +1,106 @@
+"""Detection of rate hike cycles in policy rate series.
+
+A cycle starts at the last observation of a trough, once the rate has risen by at
+least min_increase above it. It ends at the first sustained cut: the first
+observation at least min_cut below the peak of the cycle, if the rate stays that low
+for at least min_cut_duration. A cycle which has not ended runs to the last
+observation, and is named "present".
+
+The series is scanned once, so daily series covering several decades can be used.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def _cycle_name(start: pd.Timestamp, end: pd.Timestamp | None) -> str:
+    """Name a cycle after its years, like "'94-'95" or "'22-present"."""
+    end_name = "present" if end is None else f"'{end:%y}"
+    return f"'{start:%y}-{end_name}"
+
+
+def _find_cycles(
+    dates: np.ndarray,
+    rates: np.ndarray,
+    min_increase: float,
+    min_cut: float,
+    min_cut_duration: np.timedelta64,
+) -> list[tuple[int, int | None]]:
+    """Find the (start, end) positions of the cycles. The end is None for a cycle
+    which has not ended."""
+    cycles = []
+
+    trough = 0
+    peak = None
+    cut_start = None
+
+    for i, rate in enumerate(rates):
+        if peak is None:
+            # Look for a rise above the lowest rate since the last cycle
+            if rate <= rates[trough]:
+                trough = i
+            elif rate - rates[trough] >= min_increase:
+                peak = i
+
+        elif rate >= rates[peak]:
+            peak = i
+            cut_start = None
+
+        elif rates[peak] - rate >= min_cut:
+            if cut_start is None:
+                cut_start = i
+
+            # The cut is sustained, so the cycle ends where the cut started
+            if dates[i] - dates[cut_start] >= min_cut_duration:
+                cycles.append((trough, cut_start))
+                trough, peak, cut_start = i, None, None
+
+        else:
+            cut_start = None
+
+    if peak is not None:
+        cycles.append((trough, None))
+
+    return cycles
+
+
+def detect_hike_cycles(
+    df: pd.DataFrame,
+    value_column: str = "effective_rate",
+    min_increase: float = 1.0,
+    min_cut: float = 0.25,
+    min_cut_duration: str = "60D",
+) -> dict[str, tuple[str, str]]:
+    """Detect the rate hike cycles of a rate series, with date and value_column columns.
+
+    The rates are in percentage points. Returns a dictionary mapping each cycle name
+    to its (start, end) dates, as used by `base_hike_start`. The end of a cycle which
+    has not ended is the date of the last observation.
+    """
+    data = df.dropna(subset=[value_column]).sort_values("date")
+
+    dates = data.date.to_numpy(dtype="datetime64[ns]")
+    rates = data[value_column].to_numpy(dtype="float64")
+
+    cycles = _find_cycles(
+        dates,
+        rates,
+        min_increase=min_increase,
+        min_cut=min_cut,
+        min_cut_duration=pd.Timedelta(min_cut_duration).to_timedelta64(),
+    )
+
+    hikes = {}
+    for start, end in cycles:
+        start_date = pd.Timestamp(dates[start])
+        end_date = pd.Timestamp(dates[-1 if end is None else end])
+
+        name = _cycle_name(start_date, None if end is None else end_date)
+
+        # Cycles in the same years get a number
+        if name in hikes:
+            name = f"{name} ({sum(n.startswith(name) for n in hikes) + 1})"
+
+        hikes[name] = (start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
+
+    return hikes
@@ -0,0 +1,208 @@
+"""A local cache of FRED series, by vintage.
+
+Each download is stored as a CSV file named after the series and its vintage. When
+a new vintage is requested, the latest cached vintage before it is used as a base,
+and only the observations after its last date are downloaded. Revisions to older
+observations are not picked up unless refresh=True.
+
+The cache folder is tracked by git, since the scheduled job starts from a fresh
+checkout and needs the vintages of the previous runs. Only the latest KEEP_VINTAGES
+vintages of each series are kept.
+
+Downloads are retried a bounded number of times, with exponential backoff. If FRED
+cannot be reached, the latest cached vintage is used instead.
+
+The transport (the function which fetches the CSV text) can be replaced, for example
+to serve the data from a local server.
+"""
+
+import io
+import os
+import time
+from pathlib import Path
+from typing import Callable
+
+import pandas as pd
+import requests
+
+from scripts.config import Paths
+from scripts.instrumentation import instrument
+from scripts.logger import logger
+
+FRED_URL: str = "https://fred.stlouisfed.org/graph/fredgraph.csv"
+
+CACHE_FOLDER: Path = Paths.raw_data / "fred"
+
+# Number of vintages of each series kept in the cache
+KEEP_VINTAGES: int = 5
+
+# First date requested when there is no cached data
+START_DATE: str = "1954-07-01"
+
+# Maximum number of download attempts and the wait before the first retry (seconds)
+MAX_ATTEMPTS: int = 4
+BACKOFF: float = 1.0
+
+# Timeout of each request, in seconds
+TIMEOUT: float = 30.0
+
+Transport = Callable[[str, dict], str]
+
+
+def requests_transport(url: str, params: dict) -> str:
+    """Fetch the CSV text of a series with requests."""
+    response = requests.get(url, params=params, timeout=TIMEOUT)
+    response.raise_for_status()
+
+    return response.text
+
+
+def session_transport(session: requests.Session) -> Transport:
+    """A transport which fetches the CSV text with a session, so that connections
+    are reused between requests."""
+
+    def transport(url: str, params: dict) -> str:
+        response = session.get(url, params=params, timeout=TIMEOUT)
+        response.raise_for_status()
+
+        return response.text
+
+    return transport
+
+
+def _cache_path(series: str, vintage: str) -> Path:
+    return CACHE_FOLDER / f"{series}_{vintage}.csv"
+
+
+def _cached_vintages(series: str) -> list[str]:
+    """The vintages of a series which are available in the cache, oldest first."""
+    return sorted(
+        file.stem.removeprefix(f"{series}_")
+        for file in CACHE_FOLDER.glob(f"{series}_*.csv")
+    )
+
+
+def _read_cache(series: str, vintage: str) -> pd.DataFrame:
+    return pd.read_csv(_cache_path(series, vintage), parse_dates=["date"])
+
+
+def _write_cache(df: pd.DataFrame, series: str, vintage: str) -> None:
+    """Store a vintage. The file is only visible once fully written."""
+    CACHE_FOLDER.mkdir(parents=True, exist_ok=True)
+    path = _cache_path(series, vintage)
+    temp = path.with_suffix(f".{os.getpid()}.tmp")
+
+    df.to_csv(temp, index=False, date_format="%Y-%m-%d")
+    os.replace(temp, path)
+
+    for old in _cached_vintages(series)[:-KEEP_VINTAGES]:
+        _cache_path(series, old).unlink(missing_ok=True)
+
+
+def _parse(text: str, series: str) -> pd.DataFrame:
+    """Parse the CSV text returned by FRED into date and value columns.
+
+    The date column is called "DATE" or "observation_date", depending on the
+    version of the FRED API. Missing values are marked with a dot.
+    """
+    df = pd.read_csv(io.StringIO(text), na_values=["."])
+
+    return (
+        df.rename(columns={df.columns[0]: "date", series: "value"})
+        .assign(date=lambda d: pd.to_datetime(d.date))
+        .filter(["date", "value"], axis=1)
+    )
+
+
+def _download(
+    series: str, vintage: str, start: str, transport: Transport, url: str
+) -> tuple[pd.DataFrame, str]:
+    """Download the observations of a series from the start date.
+
+    Connection errors are retried for the same vintage. HTTP errors usually mean
+    that the vintage is not published yet, so the previous day is tried instead.
+    Returns the data and the vintage which was downloaded.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        params = {
+            "id": series,
+            "vintage_date": vintage,
+            "revision_date": vintage,
+            "cosd": start,
+        }
+
+        try:
+            return _parse(transport(url, params), series), vintage
+
+        except requests.exceptions.HTTPError as e:
+            logger.info(f"Error downloading {series} ({vintage}): {e}")
+            vintage = (pd.Timestamp(vintage) - pd.Timedelta(days=1)).strftime(
+                "%Y-%m-%d"
+            )
+
+        except requests.exceptions.RequestException as e:
+            logger.info(f"Error downloading {series} ({vintage}): {e}")
+
+        if attempt < MAX_ATTEMPTS - 1:
+            time.sleep(BACKOFF * 2**attempt)
+
+    raise ConnectionError(f"Could not download {series} after {MAX_ATTEMPTS} tries")
+
+
+@instrument("load")
+def get_fred_series(
+    series: str,
+    vintage: str | None = None,
+    transport: Transport = requests_transport,
+    url: str = FRED_URL,
+    refresh: bool = False,
+    download: bool = True,
+) -> pd.DataFrame:
+    """Get a FRED series, as available at the vintage date, with date and value columns.
+
+    The vintage date is the date at which the data is downloaded, unless specified.
+    Cached vintages are returned without downloading anything. Otherwise, only the
+    observations after the latest cached vintage are downloaded, unless refresh is True.
+    If download is False, the latest cached vintage up to the vintage date is returned.
+    """
+    if vintage is None:
+        vintage = pd.Timestamp.today().strftime("%Y-%m-%d")
+
+    vintages = _cached_vintages(series)
+
+    if vintage in vintages and not refresh:
+        return _read_cache(series, vintage)
+
+    if not download:
+        cached = [v for v in vintages if v <= vintage]
+        if not cached:
+            raise FileNotFoundError(f"No cached vintage of {series} up to {vintage}")
+        return _read_cache(series, cached[-1])
+
+    # Use the latest vintage before the requested one as the base
+    earlier = [v for v in vintages if v < vintage]
+    base = _read_cache(series, earlier[-1]) if earlier and not refresh else None
+
+    start = (
+        START_DATE
+        if base is None or base.empty
+        else (base.date.max() + pd.DateOffset(days=1)).strftime("%Y-%m-%d")
+    )
+
+    try:
+        new, downloaded = _download(series, vintage, start, transport, url)
+
+    except ConnectionError as e:
+        if not vintages:
+            raise
+        logger.warning(f"{e}. Using the cached vintage {vintages[-1]}")
+        return _read_cache(series, vintages[-1])
+
+    df = (
+        pd.concat([base, new], ignore_index=True) if base is not None else new
+    ).drop_duplicates(subset=["date"], keep="last")
+
+    _write_cache(df, series, downloaded)
+    logger.debug(f"Downloaded {len(new)} new {series} observations ({downloaded})")
+
+    return df
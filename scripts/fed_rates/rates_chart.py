@@ -1,37 +1,28 @@
 from scripts import config
-from scripts.logger import logger
+from scripts.fed_rates.cycles import detect_hike_cycles
+from scripts.fed_rates.fred import Transport, get_fred_series, requests_transport
+from scripts.instrumentation import instrument
+from scripts.outputs import read_csv, write_csv
 
+import numpy as np
 import pandas as pd
-import requests
 
 
-def get_fed_data(vintage: str | None = None) -> pd.DataFrame:
-    """Download the effective federal funds rate from FRED.
+def get_fed_data(
+    vintage: str | None = None,
+    transport: Transport = requests_transport,
+    download: bool = True,
+) -> pd.DataFrame:
+    """Get the effective federal funds rate from FRED.
 
     The vintage date is the date at which the data is downloaded, unless specified.
+    Only the observations which are not in the local cache are downloaded. If
+    download is False, only the local cache is read.
 
     """
-    if vintage is None:
-        vintage = pd.Timestamp.today().strftime("%Y-%m-%d")
-
-    url = (
-        "https://fred.stlouisfed.org/graph/fredgraph.csv?"
-        "id=FEDFUNDS&"
-        f"vintage_date={vintage}&revision_date={vintage}&nd=1954-07-01"
-    )
-
-    try:
-        return pd.read_csv(url, parse_dates=["DATE"]).rename(
-            columns={"FEDFUNDS": "effective_rate", "DATE": "date"}
-        )
-
-    except requests.exceptions.HTTPError as e:
-        logger.info(f"Error downloading data: {e}")
-
-        # vintage is yesterday
-        vintage = (pd.Timestamp.today() - pd.Timedelta(days=1)).strftime("%Y-%m-%d")
-
-        return get_fed_data(vintage)
+    return get_fred_series(
+        "FEDFUNDS", vintage=vintage, transport=transport, download=download
+    ).rename(columns={"value": "effective_rate"})
 
 
 def hike_periods() -> dict[str, tuple[str, str]]:
@@ -45,26 +36,68 @@ def hike_periods() -> dict[str, tuple[str, str]]:
     }
 
 
-def base_hike_start(df: pd.DataFrame, hikes: dict) -> pd.DataFrame:
+def cycle_numbers(dates: pd.Series, cycles: dict) -> np.ndarray:
+    """Find the cycle of each date, as its position in the cycles dictionary.
+
+    The cycles dictionary maps each name to a (start, end) tuple of dates. Both
+    dates are included in the cycle. Dates outside all cycles get -1. The cycles
+    must not overlap.
+    """
+    starts = pd.to_datetime([start for start, _ in cycles.values()]).to_numpy()
+    ends = pd.to_datetime([end for _, end in cycles.values()]).to_numpy()
+
+    # Sort the cycles by start date, to search for the dates in them
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], ends[order]
+
+    if np.any(starts[1:] <= ends[:-1]):
+        raise ValueError("The cycles must not overlap")
+
+    dates = dates.to_numpy(dtype="datetime64[ns]")
+
+    # Latest cycle starting on or before each date
+    position = np.searchsorted(starts, dates, side="right") - 1
+    candidate = position.clip(min=0)
+    in_cycle = (position >= 0) & (dates <= ends[candidate])
+
+    return np.where(in_cycle, order[candidate], -1)
+
+
+@instrument("aggregate")
+def base_hike_start(
+    df: pd.DataFrame, hikes: dict, value_column: str = "effective_rate"
+) -> pd.DataFrame:
     """Calculate the change in rate from the start of the rate hike cycle.
 
     Adds a column with the number of months since the start of the rate hike cycle.
     Adds a column with the cycle name.
+
+    The hikes dictionary maps each cycle name to a (start, end) tuple of dates, as
+    returned by `hike_periods`. The rows are sorted by cycle, in the order of the
+    dictionary. Observations outside all cycles are dropped.
     """
-    hikes_dfs = pd.DataFrame()
-    for name, (start, end) in hikes.items():
-        d_ = df.query(f"date >= '{start}' & date <= '{end}'").assign(
-            change=lambda d: round(d.effective_rate - d.effective_rate.min(), 4),
-            months=lambda d: (
-                (d.date.dt.year - d.date.min().date().year) * 12
+    cycles = cycle_numbers(df.date, hikes)
+    in_cycle = cycles >= 0
+
+    df = df.loc[in_cycle].assign(cycle=cycles[in_cycle])
+    groups = df.groupby("cycle")
+
+    # First date and lowest rate of each cycle
+    first_date = groups.date.transform("min")
+    lowest_rate = groups[value_column].transform("min")
+
+    return (
+        df.assign(
+            change=(df[value_column] - lowest_rate).round(4),
+            months=(
+                (df.date.dt.year - first_date.dt.year) * 12
                 + df.date.dt.month
-                - d.date.min().date().month
+                - first_date.dt.month
             ).astype("Int32"),
-            cycle=name,
         )
-        hikes_dfs = pd.concat([hikes_dfs, d_])
-
-    return hikes_dfs
+        .sort_values("cycle", kind="stable")
+        .assign(cycle=lambda d: np.array(list(hikes), dtype=object)[d.cycle])
+    )
 
 
 def reformat_data(df: pd.DataFrame) -> pd.DataFrame:
@@ -75,22 +108,33 @@ def filter_columns(df: pd.DataFrame) -> pd.DataFrame:
     return df.filter(["change", "months", "cycle", "date", "effective_rate"], axis=1)
 
 
-def update_fed_rate_hikes_chart_data() -> None:
-    """Pipeline to get, clean, and process the data for the Fed Rate Hikes chart."""
-    df = get_fed_data()
-    hikes = hike_periods()
+@instrument("chart")
+def update_fed_rate_hikes_chart_data(
+    df: pd.DataFrame | None = None, detect_cycles: bool = False
+) -> None:
+    """Pipeline to get, clean, and process the data for the Fed Rate Hikes chart.
+
+    The effective rate data can be passed, otherwise it is downloaded.
+    If detect_cycles is True, the hike cycles are detected from the data instead
+    of using `hike_periods`.
+    """
+    if df is None:
+        df = get_fed_data()
+
+    hikes = detect_hike_cycles(df) if detect_cycles else hike_periods()
 
     hikes_data = base_hike_start(df, hikes).pipe(reformat_data).pipe(filter_columns)
 
-    hikes_data.to_csv(config.Paths.output / "fed_rate_hikes.csv", index=False)
+    hikes_data.pipe(write_csv, config.Paths.output / "fed_rate_hikes.csv", index=False)
 
 
+@instrument("chart")
 def wide_fed_rates_chart() -> None:
-    df = pd.read_csv(config.Paths.output / "fed_rate_hikes.csv")
+    df = read_csv(config.Paths.output / "fed_rate_hikes.csv")
     df = df.pivot(
         index=["months", "date", "effective_rate"], columns="cycle", values="change"
     )
-    df.to_csv(config.Paths.output / "fed_rate_hikes_wide_flourish_chart.csv")
+    df.pipe(write_csv, config.Paths.output / "fed_rate_hikes_wide_flourish_chart.csv")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,196 @@
+"""Concurrent prefetch of the remote data used by a run.
+
+Each remote source (IDS, WEO, WFP, FRED) is a set of download tasks which save their
+data to the raw_data folder. `prefetch` runs the tasks of all the sources at the same
+time with asyncio, so that their network waits overlap. The transforms which follow
+only read the local files.
+
+Each source has its own limits: how many of its tasks can run at the same time, the
+minimum interval between the start of two tasks, the timeout of each attempt and the
+number of attempts. Failed attempts are retried with exponential backoff.
+
+The downloads (bblocks, or requests for the sources downloaded directly) are
+blocking, and bblocks doesn't take a timeout. So each attempt runs in its own
+process, which is killed when it times out. An attempt keeps its slot of the source
+until its process has ended, so a retry never runs alongside an earlier attempt.
+Tasks must be picklable (e.g. partials of module level functions).
+
+Since each attempt has its own process, connections are never shared between tasks
+or attempts. A task which makes several requests can reuse its connection with a
+requests session (e.g. the FRED task, see `session_transport`).
+"""
+
+import asyncio
+import multiprocessing
+import time
+from dataclasses import dataclass, field
+from multiprocessing.connection import Connection
+from typing import Any, Callable
+
+from scripts.instrumentation import add_records, collect_records, stage
+from scripts.logger import logger
+
+Task = Callable[[], Any]
+
+# Seconds between checks on the process of an attempt
+POLL_INTERVAL: float = 0.05
+
+
+@dataclass(frozen=True)
+class Source:
+    """A remote source: its download tasks, by name, and the limits which apply to
+    them. Timeouts and backoff are in seconds."""
+
+    name: str
+    tasks: dict[str, Task] = field(default_factory=dict)
+    max_concurrent: int = 1
+    min_interval: float = 0.0
+    timeout: float = 600.0
+    attempts: int = 3
+    backoff: float = 2.0
+
+
+class _RateLimit:
+    """Limit the number of tasks of a source which run at the same time, and the
+    interval between their starts."""
+
+    def __init__(self, max_concurrent: int, min_interval: float):
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._lock = asyncio.Lock()
+        self._min_interval = min_interval
+        self._next_start = 0.0
+
+    async def __aenter__(self) -> None:
+        await self._semaphore.acquire()
+
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            wait = self._next_start - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._next_start = loop.time() + self._min_interval
+
+    async def __aexit__(self, *exc) -> None:
+        self._semaphore.release()
+
+
+def _run_attempt(name: str, task: Task, connection: Connection) -> None:
+    """Run a task in the process of an attempt, recorded as a load stage. The error
+    (if any) and the records of the process are sent back through the connection."""
+    # A forked process starts with a copy of the records of its parent
+    collect_records()
+
+    error = None
+    try:
+        with stage(name, "load"):
+            task()
+    except Exception as e:
+        error = repr(e)
+
+    connection.send((error, collect_records()))
+    connection.close()
+
+
+async def _attempt(name: str, task: Task, timeout: float) -> None:
+    """Run a task in a new process, and wait until the process has ended. The
+    process is killed if it takes longer than the timeout."""
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(
+        target=_run_attempt, args=(name, task, sender), daemon=True
+    )
+    process.start()
+    sender.close()
+
+    deadline = time.perf_counter() + timeout
+    received = False
+    try:
+        while not receiver.poll():
+            if not process.is_alive() and not receiver.poll():
+                raise ConnectionError(f"Process exited with code {process.exitcode}")
+            if time.perf_counter() > deadline:
+                raise TimeoutError(f"Timed out after {timeout}s")
+            await asyncio.sleep(POLL_INTERVAL)
+
+        error, records = receiver.recv()
+        received = True
+
+    finally:
+        if not received:
+            process.terminate()
+        while process.is_alive():
+            await asyncio.sleep(POLL_INTERVAL)
+        process.join()
+        receiver.close()
+
+    add_records(records)
+    if error is not None:
+        raise ConnectionError(error)
+
+
+async def _run_task(source: Source, name: str, task: Task, limit: _RateLimit) -> float:
+    """Run a task of a source within its limits, retrying failed attempts. Returns
+    the seconds taken by the successful attempt."""
+    for attempt in range(source.attempts):
+        async with limit:
+            start = time.perf_counter()
+            try:
+                await _attempt(f"fetch {source.name} {name}", task, source.timeout)
+                return time.perf_counter() - start
+
+            except Exception as e:
+                error = e
+                logger.info(
+                    f"Error fetching {source.name} {name} "
+                    f"(attempt {attempt + 1} of {source.attempts}): {e!r}"
+                )
+
+        if attempt < source.attempts - 1:
+            await asyncio.sleep(source.backoff * 2**attempt)
+
+    raise ConnectionError(f"Could not fetch {source.name} {name}") from error
+
+
+async def _prefetch(sources: list[Source]) -> None:
+    tasks = [
+        (source, name, task)
+        for source in sources
+        for name, task in source.tasks.items()
+    ]
+    limits = {
+        source.name: _RateLimit(source.max_concurrent, source.min_interval)
+        for source in sources
+    }
+
+    results = await asyncio.gather(
+        *[
+            _run_task(source, name, task, limits[source.name])
+            for source, name, task in tasks
+        ],
+        return_exceptions=True,
+    )
+
+    for (source, name, _), result in zip(tasks, results):
+        if not isinstance(result, BaseException):
+            logger.debug(f"Fetched {source.name} {name} in {result:.2f}s")
+
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        raise ConnectionError(
+            f"{len(errors)} of {len(tasks)} downloads failed: "
+            + ", ".join(str(e) for e in errors)
+        ) from errors[0]
+
+
+def prefetch(sources: list[Source]) -> None:
+    """Download the data of all the sources concurrently.
+
+    All the tasks are run, even if some fail. If any of them failed after all its
+    attempts, a ConnectionError is raised once the others have finished.
+    """
+    start = time.perf_counter()
+    asyncio.run(_prefetch(sources))
+
+    logger.info(
+        f"Fetched {', '.join(source.name for source in sources)} "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
@@ -1,42 +1,23 @@
 import pandas as pd
 
-from scripts.config import Paths
-from bblocks import set_bblocks_data_path, WorldEconomicOutlook
-
-set_bblocks_data_path(Paths.raw_data)
+from scripts.weo import update_weo, weo_indicator
 
 
 def get_government_revenue_gdp(update_data: bool = False) -> pd.DataFrame:
-    indicator = "GGR_NGDP"
-    weo = WorldEconomicOutlook()
-    weo.load_data(indicator=indicator)
     if update_data:
-        weo.update_data(reload_data=True, year=None, release=None)
-    return weo.get_data().assign(
-        indicator="Government Revenue (% GDP)", year=lambda d: d.year.dt.year
-    )
+        update_weo()
+    return weo_indicator("GGR_NGDP").assign(indicator="Government Revenue (% GDP)")
 
 
 def get_government_expenditure_gdp(update_data: bool = False) -> pd.DataFrame:
-    indicator = "GGX_NGDP"
-    weo = WorldEconomicOutlook()
-    weo.load_data(indicator=indicator)
     if update_data:
-        weo.update_data(reload_data=True, year=None, release=None)
-    return weo.get_data().assign(
-        indicator="Government Expenditure (% GDP)", year=lambda d: d.year.dt.year
-    )
+        update_weo()
+    return weo_indicator("GGX_NGDP").assign(indicator="Government Expenditure (% GDP)")
 
 
 def get_gdp_usd(update_data: bool = False) -> pd.DataFrame:
-    indicator = "NGDPD"
-    weo = WorldEconomicOutlook()
-    weo.load_data(indicator=indicator)
-
     if update_data:
-        weo.update_data(reload_data=True, year=None, release=None)
-    return weo.get_data().assign(
-        indicator="GDP (USD)",
-        value=lambda d: d.value * 1e9,
-        year=lambda d: d.year.dt.year,
+        update_weo()
+    return weo_indicator("NGDPD").assign(
+        indicator="GDP (USD)", value=lambda d: d.value * 1e9
     )
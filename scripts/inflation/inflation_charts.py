@@ -1,16 +1,25 @@
 import numpy as np
 from bblocks import (
-    set_bblocks_data_path,
-    WFPData,
     add_short_names_column,
     convert_id,
     filter_african_countries,
-    WorldEconomicOutlook,
 )
-from scripts.config import Paths
+from scripts.config import Paths, set_bblocks_path
+from scripts.debt.schema import group_by_keys
+from scripts.instrumentation import instrument
+from scripts.inflation.wfp import read_wfp_inflation
+from scripts.weo import weo_indicator
 import pandas as pd
 
-set_bblocks_data_path(Paths.raw_data / "bblocks_data")
+INCOME_LEVELS: list = [
+    "Low income",
+    "Lower middle income",
+    "Upper middle income",
+    "High income",
+]
+
+# Share of the members of a group which must have data to compute its average
+MIN_REGION_COVERAGE: float = 0.85
 
 
 def _weo_advanced_economies() -> list:
@@ -64,9 +73,9 @@ def _weo_advanced_economies() -> list:
     ).to_list()
 
 
-def _world_inflation(wfp: WFPData, indicator="Inflation Rate") -> pd.DataFrame:
+def _world_inflation(indicator="Inflation Rate") -> pd.DataFrame:
     return (
-        wfp.get_data("inflation")
+        read_wfp_inflation(start_year=2019, end_year=2023, indicators=[indicator])
         .pipe(add_short_names_column, id_column="iso_code")
         .loc[lambda d: d.date.dt.year.between(2019, 2023)]
         .loc[lambda d: d.indicator == indicator]
@@ -81,49 +90,143 @@ def _world_inflation(wfp: WFPData, indicator="Inflation Rate") -> pd.DataFrame:
 
 
 def _ppp_gdp() -> pd.DataFrame:
-    weo = WorldEconomicOutlook()
-    weo.load_data("PPPGDP")
-    return (
-        weo.get_data().assign(year=lambda d: d.year.dt.year).drop(columns=["indicator"])
+    return weo_indicator("PPPGDP").drop(columns=["indicator"])
+
+
+@instrument("aggregate")
+def regional_weighted_averages(
+    df: pd.DataFrame,
+    regions: dict,
+    idx: list = None,
+    value_column: str = "value",
+    weight_column: str = "value_ppp",
+    decimals: int = 1,
+) -> pd.DataFrame:
+    """Compute the weighted average of the value_column for several regions at once.
+
+    The regions dictionary maps each region name to a tuple with the iso codes of
+    its members (or None to include all countries) and the minimum number of
+    countries with data needed to compute the average.
+
+    For each group defined by idx and each region, the number of countries with data,
+    the sum of the weights and the weighted sum of the values are computed in a single
+    pass. Rows missing the value or the weight are ignored. Averages for groups with
+    fewer countries than the threshold are NaN.
+
+    The result contains the idx columns, the value_column and a "name_short" column
+    with the name of the region.
+    """
+
+    # Set default value for idx
+    if idx is None:
+        idx = ["date", "indicator_name"]
+
+    # Rows with missing keys are kept in groups of their own
+    groups = group_by_keys(df, idx)
+
+    # Group number of each row, in the same (sorted) order as the result of the groupby
+    codes = groups.ngroup().to_numpy()
+    n_groups = groups.ngroups
+
+    values = df[value_column].to_numpy(dtype="float64")
+    weights = df[weight_column].to_numpy(dtype="float64")
+    valid = ~np.isnan(values) & ~np.isnan(weights) & df.iso_code.notna().to_numpy()
+
+    # Membership of each row in each region (rows x regions)
+    membership = np.column_stack(
+        [
+            valid if members is None else valid & df.iso_code.isin(members).to_numpy()
+            for members, _ in regions.values()
+        ]
     )
 
+    # Number each (region, group) pair and add up every row in its pairs
+    rows, region = np.nonzero(membership)
+    pairs = region * n_groups + codes[rows]
+    size = len(regions) * n_groups
 
-def __calc_weighted_average(group, threshold: int = 100):
-    group = group.dropna(subset=["value", "value_ppp"], how="any")
-    if group.iso_code.count() < threshold:
-        return pd.Series([np.nan], index=["value"])
+    count = np.bincount(pairs, minlength=size)
+    weight_sum = np.bincount(pairs, weights=weights[rows], minlength=size)
+    weighted_sum = np.bincount(
+        pairs, weights=values[rows] * weights[rows], minlength=size
+    )
 
-    group = group.assign(weight=lambda d: d.value_ppp / d.value_ppp.sum())
+    # Only keep the averages for groups with enough countries
+    thresholds = np.repeat([threshold for _, threshold in regions.values()], n_groups)
 
-    result = round((group["value"] * group["weight"]).sum(), 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        average = np.round(weighted_sum / weight_sum, decimals)
 
-    return pd.Series([result], index=["value"])
+    keys = (
+        groups.size().reset_index().filter(idx, axis=1).astype(df[idx].dtypes.to_dict())
+    )
 
+    return pd.concat([keys] * len(regions), ignore_index=True).assign(
+        **{
+            value_column: np.where(count >= thresholds, average, np.nan),
+            "name_short": np.repeat(list(regions), n_groups),
+        }
+    )
 
-def _calculate_world_weighted_average(df: pd.DataFrame) -> pd.DataFrame:
-    return (
-        df.groupby(
-            ["date", "indicator_name"], as_index=False, dropna=False, observed=True
-        )
-        .apply(__calc_weighted_average, 145)
-        .assign(name_short="World")
+
+def _world_africa_regions(df: pd.DataFrame) -> dict:
+    """The World and Africa, with the minimum number of countries with data."""
+    countries = df.drop_duplicates(subset=["iso_code"]).filter(
+        ["name_short", "iso_code"], axis=1
     )
+    africa = filter_african_countries(countries, id_column="name_short").iso_code
+
+    return {"World": (None, 145), "Africa": (africa.to_list(), 48)}
+
 
+def _inflation_regions(df: pd.DataFrame) -> dict:
+    """The regions for which to compute aggregates, with the minimum number of
+    countries with data for each of them.
+
+    The thresholds for the World and Africa are fixed. For the other groups, a share
+    of the members (MIN_REGION_COVERAGE) must have data.
+    """
+    from bblocks.other_tools.dictionaries import income_levels
+
+    groups = {
+        level: [iso for iso, group in income_levels().items() if group == level]
+        for level in INCOME_LEVELS
+    }
+    groups["Advanced economies"] = _weo_advanced_economies()
+
+    return {
+        **_world_africa_regions(df),
+        **{
+            name: (members, int(np.ceil(MIN_REGION_COVERAGE * len(members))))
+            for name, members in groups.items()
+        },
+    }
+
+
+def _add_ppp_weights(df: pd.DataFrame) -> pd.DataFrame:
+    """Add the PPP GDP of each country and year as the value_ppp column."""
+    ppp_gdp = _ppp_gdp()
 
-def _calculate_africa_median(df: pd.DataFrame) -> pd.DataFrame:
     return (
-        df.pipe(filter_african_countries, id_column="name_short")
-        .groupby(
-            ["date", "indicator_name"],
-            as_index=False,
-            dropna=False,
-            observed=True,
+        df.assign(year=lambda d: d.date.dt.year)
+        .merge(
+            ppp_gdp.filter(["year", "iso_code", "value"]),
+            how="left",
+            on=["year", "iso_code"],
+            suffixes=("", "_ppp"),
         )
-        .apply(__calc_weighted_average, 48)
-        .assign(name_short="Africa")
+        .drop(columns=["year"])
     )
 
 
+def regional_inflation(indicator: str = "Inflation Rate") -> pd.DataFrame:
+    """Monthly PPP GDP weighted inflation for the World, Africa, the income groups
+    and the WEO advanced economies."""
+    data = _world_inflation(indicator).pipe(_add_ppp_weights)
+
+    return regional_weighted_averages(data, _inflation_regions(data))
+
+
 def _get_latest(df: pd.DataFrame) -> pd.DataFrame:
     return df.dropna(subset=["value"]).loc[
         lambda d: d.date == d.date.max(), ["value", "date"]
@@ -137,25 +240,14 @@ def _get_max(df: pd.DataFrame) -> pd.DataFrame:
 
 
 def inflation_key_numbers() -> dict:
-    wfp = WFPData()
-    wfp.load_data("inflation")
+    data = _world_inflation().pipe(_add_ppp_weights)
 
-    data = _world_inflation(wfp)
-    ppg_gdp = _ppp_gdp()
-
-    data = (
-        data.assign(year=lambda d: d.date.dt.year)
-        .merge(
-            ppg_gdp.filter(["year", "iso_code", "value"]),
-            how="left",
-            on=["year", "iso_code"],
-            suffixes=("", "_ppp"),
-        )
-        .drop(columns=["year"])
+    aggregates = regional_weighted_averages(data, _world_africa_regions(data)).dropna(
+        subset=["value"]
     )
 
-    world = _calculate_world_weighted_average(data).dropna(subset=["value"])
-    africa = _calculate_africa_median(data).dropna(subset=["value"])
+    world = aggregates.loc[lambda d: d.name_short == "World"]
+    africa = aggregates.loc[lambda d: d.name_short == "Africa"]
 
     world_max = _get_max(world)
     africa_max = _get_max(africa)
@@ -176,4 +268,5 @@ def inflation_key_numbers() -> dict:
 
 
 if __name__ == "__main__":
+    set_bblocks_path(Paths.raw_data / "bblocks_data")
     inflation_key_numbers()
@@ -0,0 +1,153 @@
+"""Fast loading of the WFP inflation data.
+
+bblocks stores the WFP inflation data as one CSV file per country, and `WFPData`
+reads all of them in full, one after the other. Here, the files are parsed in
+parallel and consolidated into a single columnar snapshot (an uncompressed feather
+file). Later runs memory-map the snapshot instead of parsing the CSV files again.
+The snapshot is rebuilt when any of the CSV files changes.
+
+The date and indicator filters are applied to the Arrow tables, before the data is
+converted to a DataFrame.
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as csv
+import pyarrow.feather as feather
+from bblocks.config import BBPaths
+
+from scripts.config import Paths
+from scripts.instrumentation import instrument
+from scripts.logger import logger
+
+SNAPSHOT_PATH: Path = Paths.cache / "wfp_inflation.feather"
+
+COLUMN_TYPES: dict = {
+    "indicator": pa.string(),
+    "date": pa.timestamp("ns"),
+    "value": pa.float64(),
+    "iso_code": pa.string(),
+}
+
+
+def _inflation_files() -> list[Path]:
+    """The inflation files downloaded by bblocks (one per country)."""
+    return sorted(Path(BBPaths.wfp_data).glob("*_inflation.csv"))
+
+
+def _files_signature(files: list[Path]) -> str:
+    """Identify a set of files by their names, sizes and modification times."""
+    return json.dumps(
+        [[file.name, file.stat().st_size, file.stat().st_mtime_ns] for file in files]
+    )
+
+
+def _read_csv(file: Path) -> pa.Table:
+    """Parse the inflation file of a single country."""
+    return csv.read_csv(
+        file,
+        convert_options=csv.ConvertOptions(
+            column_types=COLUMN_TYPES, include_columns=list(COLUMN_TYPES)
+        ),
+    )
+
+
+def _filter_table(
+    table: pa.Table, start_year: int, end_year: int, indicators: list | None
+) -> pa.Table:
+    """Keep the rows for the given years and indicators."""
+    years = pc.year(table["date"])
+    mask = pc.and_(pc.greater_equal(years, start_year), pc.less_equal(years, end_year))
+
+    if indicators is not None:
+        mask = pc.and_(mask, pc.is_in(table["indicator"], pa.array(indicators)))
+
+    return table.filter(mask)
+
+
+def _read_snapshot(signature: str) -> pa.Table | None:
+    """Memory-map the snapshot, if it was built from the same files."""
+    if not SNAPSHOT_PATH.exists():
+        return None
+
+    table = feather.read_table(SNAPSHOT_PATH, memory_map=True)
+
+    if (table.schema.metadata or {}).get(b"sources", b"").decode() != signature:
+        return None
+
+    return table
+
+
+def _write_snapshot(table: pa.Table, signature: str) -> None:
+    """Write the snapshot. The file is only visible once fully written."""
+    SNAPSHOT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    temp = SNAPSHOT_PATH.with_suffix(f".{os.getpid()}.tmp")
+
+    feather.write_feather(
+        table.replace_schema_metadata({"sources": signature}),
+        temp,
+        compression="uncompressed",
+    )
+
+    os.replace(temp, SNAPSHOT_PATH)
+
+
+@instrument("load")
+def read_wfp_inflation(
+    start_year: int = 2019,
+    end_year: int = 2023,
+    indicators: list | None = None,
+    max_workers: int | None = None,
+    snapshot: bool = True,
+) -> pd.DataFrame:
+    """Read the WFP inflation data for all countries.
+
+    Only the data for the years between start_year and end_year (inclusive) and for
+    the given indicators (all if None) is returned. The iso_code and indicator
+    columns are categorical.
+
+    If snapshot is True, the consolidated snapshot is used (and built if needed).
+    Otherwise, the CSV files are always parsed and filtered one by one.
+    """
+    files = _inflation_files()
+
+    if len(files) == 0:
+        logger.warning("No inflation data available. Run update to download data")
+        return pd.DataFrame(columns=list(COLUMN_TYPES))
+
+    signature = _files_signature(files)
+    table = _read_snapshot(signature) if snapshot else None
+
+    if table is None:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            if snapshot:
+                tables = list(pool.map(_read_csv, files))
+            else:
+                tables = list(
+                    pool.map(
+                        lambda f: _filter_table(
+                            _read_csv(f), start_year, end_year, indicators
+                        ),
+                        files,
+                    )
+                )
+
+        table = pa.concat_tables(tables).sort_by(
+            [("iso_code", "ascending"), ("date", "ascending")]
+        )
+
+        if snapshot:
+            _write_snapshot(table, signature)
+            logger.debug(f"Saved WFP inflation snapshot ({len(files)} files)")
+
+    return (
+        _filter_table(table, start_year, end_year, indicators)
+        .to_pandas(strings_to_categorical=True)
+        .filter(["indicator", "date", "value", "iso_code"], axis=1)
+    )
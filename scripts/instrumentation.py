@@ -0,0 +1,164 @@
+"""Timing and memory instrumentation for the pipeline stages.
+
+A stage is a step of the pipeline of one of these kinds: load, clean, merge, npv,
+aggregate or write. For each stage, a record is kept with its wall time, CPU time,
+peak memory (RSS) of the process and the number of input and output rows. The write
+stage is the writing of the output files (see `scripts.outputs.write_outputs`). Chart
+functions as a whole are recorded with the "chart" kind, apart from the stages.
+
+Functions are instrumented with the `instrument` decorator, and blocks of code with
+the `stage` context manager. Records are kept per process, so the scheduler collects
+the records of each job from the process that ran it (see `collect_records`). The
+records of a run are saved as a JSON report next to the output folder. The report is
+not tracked by git: the scheduled workflow uploads it as an artifact.
+"""
+
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from scripts.config import Paths
+from scripts.logger import logger
+
+REPORT_PATH: Path = Paths.project / "run_report.json"
+
+STAGES: tuple[str, ...] = ("load", "clean", "merge", "npv", "aggregate", "write")
+
+# Whole chart functions are recorded as "chart". Their time includes the stages they
+# contain, so they are kept apart from the stages.
+KINDS: tuple[str, ...] = (*STAGES, "chart")
+
+_records: list[dict] = []
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def _peak_rss() -> int:
+    """The peak RSS of the process so far, in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _rows(obj: Any) -> int | None:
+    """The number of rows of a DataFrame, Series or array (None for anything else)."""
+    shape = getattr(obj, "shape", None)
+
+    if shape is None or len(shape) == 0:
+        return None
+
+    return int(shape[0])
+
+
+@contextmanager
+def stage(name: str, kind: str, rows_in: int | None = None) -> Iterator[dict]:
+    """Record a stage of the pipeline. The record is yielded, so the number of
+    output rows can be set as `record["rows_out"]` once they are known."""
+    if kind not in KINDS:
+        raise ValueError(f"Unknown stage '{kind}'. Kinds are {KINDS}")
+
+    parents = _local.__dict__.setdefault("parents", [])
+    record = {
+        "name": name,
+        "stage": kind,
+        "parent": parents[-1] if parents else None,
+        "rows_in": rows_in,
+        "rows_out": None,
+    }
+
+    parents.append(name)
+    start_rss = _peak_rss()
+    start_cpu = time.process_time()
+    start = time.perf_counter()
+
+    try:
+        yield record
+    finally:
+        parents.pop()
+        record["wall_time"] = round(time.perf_counter() - start, 4)
+        record["cpu_time"] = round(time.process_time() - start_cpu, 4)
+        record["peak_rss"] = _peak_rss()
+        record["peak_rss_increase"] = record["peak_rss"] - start_rss
+
+        with _lock:
+            _records.append(record)
+
+        logger.debug(
+            f"{kind} {name}: {record['wall_time']:.2f}s, "
+            f"{record['rows_in']} -> {record['rows_out']} rows"
+        )
+
+
+def instrument(kind: str) -> Callable:
+    """Decorator to record each call of a function as a stage of the pipeline.
+
+    The input rows are those of the first argument, and the output rows those of
+    the result, when they are DataFrames, Series or arrays.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            first = args[0] if args else next(iter(kwargs.values()), None)
+
+            with stage(func.__qualname__, kind, rows_in=_rows(first)) as record:
+                result = func(*args, **kwargs)
+                record["rows_out"] = _rows(result)
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def collect_records() -> list[dict]:
+    """Return the records of this process, and start a new list."""
+    with _lock:
+        records = _records.copy()
+        _records.clear()
+
+    return records
+
+
+def add_records(records: list[dict]) -> None:
+    """Add the records collected from another process to the records of this one."""
+    with _lock:
+        _records.extend(records)
+
+
+def write_report(
+    pipeline: str, records: list[dict], wall_time: float, path: Path = REPORT_PATH
+) -> None:
+    """Save the records of a pipeline run, which took wall_time seconds, to the
+    JSON report.
+
+    The report keeps the latest run of each pipeline. The file is replaced in one
+    step.
+    """
+    report = {}
+    if path.exists():
+        with open(path, "r") as f:
+            report = json.load(f)
+
+    report[pipeline] = {
+        "finished": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "wall_time": round(wall_time, 4),
+        "peak_rss": max((r["peak_rss"] for r in records), default=0),
+        "stages": records,
+    }
+
+    temp = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(temp, "w") as f:
+        json.dump(report, f, indent=4)
+
+    os.replace(temp, path)
@@ -0,0 +1,126 @@
+"""Cached conversion of country and counterpart names.
+
+country_converter matches names using regular expressions, which is slow. Since the
+same few hundred names are converted on every run, each unique name is converted only
+once and the result is stored in a lookup table on disk. The table is discarded when
+the version of country_converter changes.
+"""
+
+import json
+import os
+import threading
+from importlib.metadata import version
+
+import numpy as np
+import pandas as pd
+from bblocks import convert_id
+
+from scripts.config import Paths
+
+CACHE_PATH = Paths.raw_data / "name_cache.json"
+
+_lock = threading.Lock()
+_mappings: dict | None = None
+
+
+def _country_converter_version() -> str:
+    return version("country_converter")
+
+
+def _load_mappings() -> dict:
+    """Load the lookup table from disk (only once per process)."""
+    global _mappings
+
+    if _mappings is None:
+        _mappings = {}
+
+        if CACHE_PATH.exists():
+            with open(CACHE_PATH, "r") as f:
+                cache = json.load(f)
+
+            # Only use the stored table if it was built with the same version
+            if cache.get("country_converter") == _country_converter_version():
+                _mappings = cache["mappings"]
+
+    return _mappings
+
+
+def _save_mappings(mappings: dict) -> None:
+    """Save the lookup table to disk. The file is replaced in one step, so that
+    processes running in parallel never read a partially written table."""
+    temp = CACHE_PATH.with_suffix(f".{os.getpid()}.tmp")
+
+    with open(temp, "w") as f:
+        json.dump(
+            {
+                "country_converter": _country_converter_version(),
+                "mappings": mappings,
+            },
+            f,
+            indent=2,
+            sort_keys=True,
+        )
+
+    os.replace(temp, CACHE_PATH)
+
+
+def convert_id_cached(
+    series: pd.Series,
+    from_type: str = "regex",
+    to_type: str = "ISO3",
+    not_found: str | None = None,
+) -> pd.Series:
+    """Convert a series of country IDs into the desired type, using the lookup table.
+
+    This works like bblocks' `convert_id`. Only the names which are not yet in the
+    lookup table are converted with country_converter. If not_found is None,
+    the original value is passed through for names which cannot be converted.
+    """
+
+    # if from and to are the same, return without changing anything
+    if from_type == to_type:
+        return series
+
+    with _lock:
+        mappings = _load_mappings()
+        mapping = mappings.setdefault(f"{from_type}>{to_type}", {})
+
+        # Convert the names which have not been seen before
+        missing = [name for name in series.dropna().unique() if name not in mapping]
+
+        if len(missing) > 0:
+            converted = convert_id(
+                pd.Series(missing),
+                from_type=from_type,
+                to_type=to_type,
+                not_found=np.nan,
+            )
+            # Names which match several countries are converted to a list
+            mapping.update(
+                {
+                    name: value if isinstance(value, list) or pd.notna(value) else None
+                    for name, value in zip(missing, converted)
+                }
+            )
+            _save_mappings(mappings)
+
+    return series.map(mapping).fillna(series if not_found is None else not_found)
+
+
+def add_income_level_column_cached(
+    df: pd.DataFrame,
+    id_column: str,
+    target_column: str = "income_level",
+    id_type: str = "regex",
+) -> pd.DataFrame:
+    """Add an income levels column to a dataframe, matching the IDs (of id_type) in
+    the id_column through the lookup table."""
+    from bblocks.other_tools.dictionaries import income_levels
+
+    return df.assign(
+        **{
+            target_column: convert_id_cached(
+                df[id_column], from_type=id_type, to_type="ISO3"
+            ).map(income_levels())
+        }
+    )
@@ -0,0 +1,173 @@
+"""Atomic writes of the output files (chart CSVs and key numbers).
+
+Outputs are written with `write_csv` and `update_key_numbers`. Each file is written
+to a temporary file which then replaces the original in one step, and files whose
+content has not changed are not written at all (so they don't show up in git).
+
+Inside a `buffered_outputs` block, outputs are kept in memory instead, and only
+written when the block exits without an error. The scheduler buffers the outputs of
+every job and writes them together once all the jobs have finished, so a failed run
+leaves the output folder untouched. Key number updates for the same file are merged
+and written once.
+
+CSV files can also be mirrored as compressed CSV or parquet files, in
+MIRROR_FOLDER.
+"""
+
+import gzip
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from hashlib import sha256
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+
+from scripts.config import Paths
+from scripts.instrumentation import instrument
+
+MIRROR_FOLDER: Path = Paths.output / "mirrors"
+
+MIRROR_FORMATS: tuple[str, ...] = ("csv.gz", "parquet")
+
+
+@dataclass
+class Outputs:
+    """Outputs which have not been written yet: the content of each file, and the
+    key numbers to update in each JSON file."""
+
+    files: dict[Path, bytes] = field(default_factory=dict)
+    key_numbers: dict[Path, dict] = field(default_factory=dict)
+
+    def update(self, other: "Outputs") -> None:
+        """Add the outputs of another buffer. Later files replace earlier ones, and
+        key numbers are merged."""
+        self.files.update(other.files)
+
+        for path, values in other.key_numbers.items():
+            self.key_numbers.setdefault(path, {}).update(values)
+
+    def __len__(self) -> int:
+        return len(self.files) + len(self.key_numbers)
+
+
+_buffer: Outputs | None = None
+
+
+def _same_content(path: Path, content: bytes) -> bool:
+    """Check if a file exists with the same content."""
+    if not path.exists() or path.stat().st_size != len(content):
+        return False
+
+    return sha256(path.read_bytes()).digest() == sha256(content).digest()
+
+
+def _write_file(path: Path, content: bytes) -> bool:
+    """Write a file in one step, unless its content is unchanged. Returns True if
+    the file was written."""
+    if _same_content(path, content):
+        return False
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_suffix(f"{path.suffix}.{os.getpid()}.tmp")
+    temp.write_bytes(content)
+    os.replace(temp, path)
+
+    return True
+
+
+def _mirror(path: Path, content: bytes, mirror_format: str) -> bool:
+    """Write a mirror of a CSV file in a compressed or columnar format."""
+    stem = path.name.removesuffix(".csv")
+
+    if mirror_format == "csv.gz":
+        # mtime=0 so the same content always gives the same file
+        data = gzip.compress(content, mtime=0)
+    elif mirror_format == "parquet":
+        buffer = io.BytesIO()
+        pd.read_csv(io.BytesIO(content)).to_parquet(buffer, index=False)
+        data = buffer.getvalue()
+    else:
+        raise ValueError(f"Unknown mirror format '{mirror_format}'")
+
+    return _write_file(MIRROR_FOLDER / f"{stem}.{mirror_format}", data)
+
+
+def _key_numbers_content(path: Path, values: dict) -> bytes:
+    """The content of a key numbers file, after updating it with the values."""
+    data = json.loads(path.read_text()) if path.exists() else {}
+    data.update(values)
+
+    return json.dumps(data, indent=4).encode()
+
+
+@instrument("write")
+def write_outputs(outputs: Outputs, mirrors: tuple[str, ...] = ()) -> list[Path]:
+    """Write the outputs, and the mirrors of the CSV files in the mirror formats.
+    The files are written in parallel. Returns the files which changed."""
+    files = dict(outputs.files)
+    for path, values in outputs.key_numbers.items():
+        files[path] = _key_numbers_content(path, values)
+
+    tasks = [(_write_file, path, content) for path, content in files.items()]
+    tasks += [
+        (_mirror, path, content, mirror_format)
+        for path, content in files.items()
+        if path.suffix == ".csv"
+        for mirror_format in mirrors
+    ]
+
+    with ThreadPoolExecutor() as pool:
+        written = list(pool.map(lambda task: task[0](*task[1:]), tasks))
+
+    return [path for path, changed in zip(files, written) if changed]
+
+
+def _add(outputs: Outputs) -> None:
+    """Write the outputs, or keep them in the buffer if there is one."""
+    if _buffer is None:
+        write_outputs(outputs)
+    else:
+        _buffer.update(outputs)
+
+
+def write_csv(df: pd.DataFrame, path: Path, **kwargs) -> None:
+    """Write a DataFrame as a CSV output. The arguments are passed to `to_csv`."""
+    _add(Outputs(files={Path(path): df.to_csv(**kwargs).encode()}))
+
+
+def update_key_numbers(path: Path, values: dict) -> None:
+    """Update the key numbers in a JSON output with a dictionary of new values."""
+    _add(Outputs(key_numbers={Path(path): values}))
+
+
+def read_csv(path: Path, **kwargs) -> pd.DataFrame:
+    """Read a CSV output, including one which is in the buffer. The arguments are
+    passed to `pd.read_csv`."""
+    if _buffer is not None and Path(path) in _buffer.files:
+        return pd.read_csv(io.BytesIO(_buffer.files[Path(path)]), **kwargs)
+
+    return pd.read_csv(path, **kwargs)
+
+
+@contextmanager
+def buffered_outputs(write: bool = True) -> Iterator[Outputs]:
+    """Keep the outputs in memory during the block. They are written when the
+    block exits without an error, unless write is False (so they can be written
+    later, e.g. by another process). The buffer is yielded."""
+    global _buffer
+
+    previous, _buffer = _buffer, Outputs()
+    buffer = _buffer
+
+    try:
+        yield buffer
+    finally:
+        _buffer = previous
+
+    if write:
+        _add(buffer)
@@ -0,0 +1,119 @@
+"""Classification of indicators into ordered categories (e.g. "very low" to "very
+high") by comparing each country's typical value with quantile thresholds.
+
+A scheme defines how a country's value is summarised and which values the
+thresholds are computed from. Many indicators and schemes are classified in one
+pass: the medians and thresholds of all the indicators are computed together, and
+the categories are assigned by comparing arrays of values and thresholds.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+LABELS: tuple[str, ...] = ("very low", "low", "moderate", "high", "very high")
+
+
+@dataclass(frozen=True)
+class Scheme:
+    """A way to assign categories to the values of an indicator.
+
+    Each country's value is the median over a window of years: all of its years if
+    window is None, otherwise the `window` years up to each year. The thresholds
+    are quantiles which split the values into as many groups as there are labels.
+    They are computed over all the data, or if by_year is True, over the values of
+    the `window` years up to each year (only that year if window is None).
+    """
+
+    name: str
+    labels: tuple[str, ...] = LABELS
+    by_year: bool = False
+    window: int | None = None
+
+    @property
+    def quantiles(self) -> np.ndarray:
+        return np.linspace(0, 1, len(self.labels) + 1)
+
+
+def _medians(
+    df: pd.DataFrame,
+    columns: list[str],
+    id_column: str,
+    year_column: str,
+    window: int | None,
+) -> np.ndarray:
+    """The median of each country (over all years or a rolling window), by row."""
+    if window is None:
+        medians = df.groupby(id_column, sort=False)[columns].transform("median")
+        return medians.to_numpy(dtype="float64")
+
+    medians = (
+        df.sort_values(year_column, kind="stable")
+        .groupby(id_column, sort=False)[columns]
+        .rolling(window, min_periods=1)
+        .median()
+        .droplevel(0)
+        .reindex(df.index)
+    )
+    return medians.to_numpy(dtype="float64")
+
+
+def _thresholds(values: np.ndarray, years: np.ndarray, scheme: Scheme) -> np.ndarray:
+    """The quantile thresholds of each column, by row (rows x columns x thresholds)."""
+    if not scheme.by_year:
+        edges = np.nanquantile(values, scheme.quantiles, axis=0).T
+        return np.broadcast_to(edges, (len(values), *edges.shape))
+
+    window = 1 if scheme.window is None else scheme.window
+    unique_years, positions = np.unique(years, return_inverse=True)
+
+    edges = np.stack(
+        [
+            np.nanquantile(
+                values[(years > year - window) & (years <= year)],
+                scheme.quantiles,
+                axis=0,
+            ).T
+            for year in unique_years
+        ]
+    )
+    return edges[positions]
+
+
+def _codes(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """The position of the values between the thresholds (-1 if outside them or
+    missing). Intervals are closed on the right, and the lowest on both sides."""
+    codes = (values[..., None] > edges[..., 1:-1]).sum(axis=-1)
+    inside = (values >= edges[..., 0]) & (values <= edges[..., -1])
+
+    return np.where(inside, codes, -1)
+
+
+def classify(
+    df: pd.DataFrame,
+    columns: list[str],
+    schemes: list[Scheme],
+    id_column: str = "iso_code",
+    year_column: str = "year",
+) -> pd.DataFrame:
+    """Assign a category to each row for each of the columns and schemes.
+
+    The categories are added as ordered categorical columns named
+    "{column}_{scheme name}", so sorting by them follows the order of the labels.
+    """
+    years = df[year_column].to_numpy()
+    values = df[columns].to_numpy(dtype="float64")
+    categories = {}
+
+    with np.errstate(invalid="ignore"):
+        for scheme in schemes:
+            medians = _medians(df, columns, id_column, year_column, scheme.window)
+            codes = _codes(medians, _thresholds(values, years, scheme))
+
+            for position, column in enumerate(columns):
+                categories[f"{column}_{scheme.name}"] = pd.Categorical.from_codes(
+                    codes[:, position], categories=list(scheme.labels), ordered=True
+                )
+
+    return df.assign(**categories)
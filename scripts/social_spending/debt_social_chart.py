@@ -1,13 +1,26 @@
+"""Debt service compared with social spending, as a share of government expenditure.
+
+All the indicators in % of GDP (debt service, health, education, etc.) are aligned
+on (iso_code, year) with government expenditure, which is loaded once, and all the
+ratios are computed together.
+"""
+
+import functools
+
 import pandas as pd
-from bblocks import (
-    add_income_level_column,
-    add_short_names_column,
-    filter_african_countries,
-)
 
 from scripts import config
 from scripts.debt.debt_service import service_data
 from scripts.government.revenue import get_gdp_usd, get_government_expenditure_gdp
+from scripts.names import add_income_level_column_cached, convert_id_cached
+from scripts.outputs import write_csv
+from scripts.social_spending.categories import Scheme, classify
+
+# Files with the spending categories, in % of GDP
+SPENDING_FILES: dict[str, str] = {
+    "health": "health_spending_gdp.csv",
+    "education": "education_spending_gdp.csv",
+}
 
 
 def debt_gdp(update_data: bool = False) -> pd.DataFrame:
@@ -23,19 +36,42 @@ def debt_gdp(update_data: bool = False) -> pd.DataFrame:
     )
 
 
-def _gdp2exp(indicator_df: pd.DataFrame, indicator_name: str) -> pd.DataFrame:
-    exp = get_government_expenditure_gdp()
-    return (
-        pd.merge(
-            indicator_df, exp, on=["iso_code", "year"], suffixes=("_indicator", "_exp")
-        )
-        .assign(
-            value=lambda d: round(100 * d.value_indicator / d.value_exp, 4),
-            indicator=indicator_name,
-        )
-        .filter(["iso_code", "year", "value", "indicator"], axis=1)
+def spending_gdp(category: str) -> pd.DataFrame:
+    """A spending category (see SPENDING_FILES), in % of GDP."""
+    return pd.read_csv(config.Paths.raw_data / SPENDING_FILES[category])
+
+
+def expenditure_shares(indicators: dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """Convert indicators in % of GDP to % of government expenditure, all at once.
+
+    The indicators are passed as a dictionary of names to DataFrames with iso_code,
+    year and value columns. The result has the iso_code and year, and a column with
+    each indicator, for the years where all of them and expenditure are available.
+    The rows are in the order of the first indicator.
+    """
+    keys = ["iso_code", "year"]
+    frames = [
+        df.filter([*keys, "value"], axis=1).rename(columns={"value": name})
+        for name, df in indicators.items()
+    ]
+    expenditure = (
+        get_government_expenditure_gdp()
+        .filter([*keys, "value"], axis=1)
+        .rename(columns={"value": "__expenditure__"})
+    )
+
+    shares = functools.reduce(
+        lambda left, right: left.merge(right, on=keys), [*frames, expenditure]
     )
 
+    return shares[keys].join(
+        (100 * shares[list(indicators)]).div(shares["__expenditure__"], axis=0).round(4)
+    )
+
+
+def _gdp2exp(indicator_df: pd.DataFrame, indicator_name: str) -> pd.DataFrame:
+    return expenditure_shares({"value": indicator_df}).assign(indicator=indicator_name)
+
 
 def debt_exp(update_data: bool = False) -> pd.DataFrame:
     debt = debt_gdp(update_data=update_data)
@@ -44,73 +80,50 @@ def debt_exp(update_data: bool = False) -> pd.DataFrame:
 
 
 def health_spending() -> pd.DataFrame:
-    health = pd.read_csv(config.Paths.raw_data / "health_spending_gdp.csv")
-
-    return _gdp2exp(health, "Health (% Expenditure)")
+    return _gdp2exp(spending_gdp("health"), "Health (% Expenditure)")
 
 
 def education_spending() -> pd.DataFrame:
-    education = pd.read_csv(config.Paths.raw_data / "education_spending_gdp.csv")
+    return _gdp2exp(spending_gdp("education"), "Education (% Expenditure)")
 
-    return _gdp2exp(education, "Education (% Expenditure)")
 
+def debt_spending_shares(
+    categories: list[str] | None = None, update_data: bool = False
+) -> pd.DataFrame:
+    """Debt service and the spending categories (all if None) in % of government
+    expenditure, as value_debt, value_{category}, etc. columns. The name and income
+    level of each country are added through the cached lookups."""
+    if categories is None:
+        categories = list(SPENDING_FILES)
 
-def debt_health_comparison_chart(update_data: bool = False) -> None:
-    debt = debt_exp(update_data=update_data)
-    health = health_spending()
+    indicators = {"value_debt": debt_gdp(update_data=update_data)} | {
+        f"value_{category}": spending_gdp(category) for category in categories
+    }
 
-    df = (
-        pd.merge(debt, health, on=["iso_code", "year"], suffixes=("_debt", "_health"))
-        .pipe(
-            add_short_names_column,
-            id_column="iso_code",
-            id_type="ISO3",
-            target_column="name",
-        )
-        .filter(
-            [
-                "iso_code",
-                "name",
-                "year",
-                "value_debt",
-                "value_health",
-                "value_education",
-            ]
+    return (
+        expenditure_shares(indicators)
+        .assign(
+            name=lambda d: convert_id_cached(
+                d.iso_code, from_type="ISO3", to_type="short_name"
+            )
         )
+        .pipe(add_income_level_column_cached, id_column="iso_code", id_type="ISO3")
+        .filter(["iso_code", "name", "year", *indicators, "income_level"], axis=1)
     )
 
-    df = add_income_level_column(df, id_column="iso_code", id_type="ISO3")
 
-    # Define labels
-    labels = ["very low", "low", "moderate", "high", "very high"]
-
-    order = {
-        "very low": 0,
-        "low": 1,
-        "moderate": 2,
-        "high": 3,
-        "very high": 4,
-    }
-
-    # Compute the quantile thresholds based on the entire dataset's distribution
-    quantiles = df["value_debt"].quantile([0, 0.2, 0.4, 0.6, 0.8, 1]).values
-
-    # For each country, compute the median value over the years
-    medians = df.groupby("name")["value_debt"].median()
-
-    # Use the computed quantile thresholds to assign a label to each country's median value
-    country_labels = pd.cut(medians, bins=quantiles, labels=labels, include_lowest=True)
+def debt_health_comparison_chart(update_data: bool = False) -> None:
+    df = debt_spending_shares(["health"], update_data=update_data)
 
-    # Map the country labels to the original DataFrame
-    df["category"] = df["name"].map(country_labels)
+    # Each country's median over the years, compared with the quintiles of all values
     df = (
-        df.assign(order=lambda d: d.category.map(order))
-        .sort_values(["year", "order"])
-        .drop("order", axis=1)
+        classify(df, ["value_debt"], [Scheme("category")], id_column="name")
+        .rename(columns={"value_debt_category": "category"})
+        .sort_values(["year", "category"])
         .loc[lambda d: d.year < 2021]
     )
-    df.to_csv(
+    df.pipe(
+        write_csv,
         config.Paths.output / "debt_health_2020.csv",
         index=False,
     )
-
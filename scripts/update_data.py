@@ -1,5 +1,6 @@
 """Update data for the project"""
 
+from scripts.config import set_bblocks_path
 from scripts.logger import logger
 from scripts.debt.debt_service import update_debt_service
 
@@ -7,10 +8,11 @@ from scripts.debt.debt_service import update_debt_service
 def update_data() -> None:
     """Pipeline to update data"""
 
+    set_bblocks_path()
     update_debt_service(star_year=2000, end_year=2021)
     logger.info("Updated debt service data")
 
-    #TODO: Add other data updates here
+    # TODO: Add other data updates here
 
     logger.info("Successfully updated all data")
 
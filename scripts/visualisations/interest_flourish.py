@@ -7,12 +7,14 @@ from scripts.debt.interest_analysis import (
     expected_payments_on_new_debt,
     get_merged_rates_commitments_payments_data,
 )
+from scripts.debt.schema import keys_as_strings
 from scripts.debt.tools import (
-    add_weights,
-    compute_weighted_averages,
     flag_africa,
     order_income,
+    weighted_group_averages,
 )
+from scripts.instrumentation import instrument
+from scripts.outputs import write_csv
 
 
 def scatter_rate_interest_africa_other(
@@ -57,6 +59,7 @@ def scatter_rate_interest_africa_other(
     return df.filter(output_cols, axis=1)
 
 
+@instrument("chart")
 def chart_data_africa_other_rates_scatter(start_year: int, end_year: int) -> None:
     """A CSV of the data for a scatterplot of interest rates for africa and other countries.
 
@@ -65,7 +68,8 @@ def chart_data_africa_other_rates_scatter(start_year: int, end_year: int) -> Non
     afr_others_rates_scatter = scatter_rate_interest_africa_other(
         start_year=start_year, end_year=end_year
     )
-    afr_others_rates_scatter.to_csv(
+    afr_others_rates_scatter.pipe(
+        write_csv,
         Paths.output / f"afr_others_rates_scatter_{start_year}_{end_year}.csv",
         index=False,
     )
@@ -89,12 +93,11 @@ def smooth_line_rate_interest_africa_other_income(
     # Keep only countries with market access
     # df = df.pipe(keep_market_access_only)
 
-    # Add weights
+    # Compute weighted average, with weights based on commitments
     idx = ["year", "counterpart_area", "continent", "income_level"]
-    df = add_weights(df, idx=idx, value_column="value_commitments")
-
-    # Compute weighted average
-    df = df.pipe(compute_weighted_averages, idx=idx, value_columns=["value_rate"])
+    df = weighted_group_averages(
+        df, idx=idx, value_columns=["value_rate"], weight_column="value_commitments"
+    )
 
     # Filter columns
     cols = ["year", "counterpart_area", "income_level", "continent", "avg_rate"]
@@ -120,6 +123,7 @@ def smooth_line_rate_interest_africa_other_income(
     return df
 
 
+@instrument("chart")
 def chart_africa_other_bondholders_ibrd_line(start_year: int, end_year: int) -> None:
     """A CSV of the data for a smooth line of interest rates for africa and other countries.
 
@@ -142,6 +146,7 @@ def chart_africa_other_bondholders_ibrd_line(start_year: int, end_year: int) ->
             columns="counterpart_area",
             values="avg_rate",
         )
+        .sort_index(axis=1)
         .reset_index()
         .pipe(
             order_income,
@@ -150,12 +155,14 @@ def chart_africa_other_bondholders_ibrd_line(start_year: int, end_year: int) ->
         )
     )
 
-    afr_others_rates_smooth_line.to_csv(
+    afr_others_rates_smooth_line.pipe(
+        write_csv,
         Paths.output / f"afr_others_rates_smooth_line_{start_year}_{end_year}.csv",
         index=False,
     )
 
 
+@instrument("chart")
 def export_africa_geometries():
     """Export a CSV of the geometries for African countries.
 
@@ -173,8 +180,8 @@ def export_africa_geometries():
 
     africa = add_flourish_geometries(africa, "ISO3", "ISO3")
 
-    africa.filter(["ISO3", "geometry"]).to_csv(
-        Paths.output / "africa_geometries.csv", index=False
+    africa.filter(["ISO3", "geometry"]).pipe(
+        write_csv, Paths.output / "africa_geometries.csv", index=False
     )
 
 
@@ -196,32 +203,40 @@ def _helper_scrolly_chart_map_counterpart_2021_rates(
             update_data=update_data,
         )
         .loc[lambda d: d.counterpart_area == counterpart]
+        .pipe(keys_as_strings, columns=["country"])
         .pipe(add_iso_codes_column, id_column="country", id_type="regex")
         .filter(["iso_code", "country", "year", "value_rate", "continent"])
         .rename(columns={"value_rate": "rate"})
     )
 
 
+@instrument("chart")
 def chart_scrolly_chart_map_africa_ibrd_2021_rates(update_data: bool = False) -> None:
     data = _helper_scrolly_chart_map_counterpart_2021_rates(
         counterpart="World Bank-IBRD", update_data=update_data
     )
 
-    data.to_csv(
-        Paths.output / "scrolly_chart_map_ibrd_africa_2021_rates.csv", index=False
+    data.pipe(
+        write_csv,
+        Paths.output / "scrolly_chart_map_ibrd_africa_2021_rates.csv",
+        index=False,
     )
 
 
+@instrument("chart")
 def chart_scrolly_chart_map_africa_bonds_2021_rates(update_data: bool = False) -> None:
     data = _helper_scrolly_chart_map_counterpart_2021_rates(
         counterpart="Bondholders", update_data=update_data
     )
 
-    data.to_csv(
-        Paths.output / "scrolly_chart_map_ibrd_africa_2021_rates.csv", index=False
+    data.pipe(
+        write_csv,
+        Paths.output / "scrolly_chart_map_ibrd_africa_2021_rates.csv",
+        index=False,
     )
 
 
+@instrument("chart")
 def chart_scrolly_bars_africa_bonds_vs_ibrd_rates(update_data: bool = False) -> None:
     data = counterpart_difference(
         start_year=2017,
@@ -242,11 +257,14 @@ def chart_scrolly_bars_africa_bonds_vs_ibrd_rates(update_data: bool = False) ->
             "expected_payments",
             "expected_payments_at_new_rate",
         ]
-    ).to_csv(
-        Paths.output / "scrolly_bars_africa_bonds_vs_at_ibrd_rates.csv", index=False
+    ).pipe(
+        write_csv,
+        Paths.output / "scrolly_bars_africa_bonds_vs_at_ibrd_rates.csv",
+        index=False,
     )
 
 
+@instrument("chart")
 def chart_scrolly_bars_mics_bonds_vs_ibrd_rates(update_data: bool = False) -> None:
     data = counterpart_difference(
         start_year=2017,
@@ -267,4 +285,8 @@ def chart_scrolly_bars_mics_bonds_vs_ibrd_rates(update_data: bool = False) -> No
             "expected_payments",
             "expected_payments_at_new_rate",
         ]
-    ).to_csv(Paths.output / "scrolly_bars_mics_bonds_vs_at_ibrd_rates.csv", index=False)
+    ).pipe(
+        write_csv,
+        Paths.output / "scrolly_bars_mics_bonds_vs_at_ibrd_rates.csv",
+        index=False,
+    )
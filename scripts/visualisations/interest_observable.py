@@ -1,7 +1,10 @@
 import pandas as pd
 
-from scripts.config import Paths
+from scripts.config import Paths, set_bblocks_path
 from scripts.debt.interest_analysis import expected_payments_on_new_debt
+from scripts.debt.schema import align_categories
+from scripts.instrumentation import instrument
+from scripts.outputs import write_csv
 
 
 def base_data_loans_observable_by_country_group_year(start_year: int, end_year: int):
@@ -30,9 +33,10 @@ def base_data_loans_observable_by_country_group_year(start_year: int, end_year:
         weights_by=["year", "counterpart_area"],
     ).assign(group_name="Middle income countries")
 
-    return pd.concat([africa_data, mic_data], ignore_index=True)
+    return pd.concat(align_categories(africa_data, mic_data), ignore_index=True)
 
 
+@instrument("chart")
 def chart_observable_interactive_interest_payments() -> None:
     """A CSV of the data for the interactive chart of interest payments."""
     df = base_data_loans_observable_by_country_group_year(
@@ -55,10 +59,13 @@ def chart_observable_interactive_interest_payments() -> None:
         ]
     )
 
-    df.to_csv(
-        Paths.output / "country_counterpart_with_weights_2017-21.csv.csv", index=False
+    df.pipe(
+        write_csv,
+        Paths.output / "country_counterpart_with_weights_2017-21.csv.csv",
+        index=False,
     )
 
 
 if __name__ == "__main__":
+    set_bblocks_path()
     chart_observable_interactive_interest_payments()
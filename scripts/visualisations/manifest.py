@@ -0,0 +1,98 @@
+"""A manifest of the inputs used to produce each output file.
+
+For each job with outputs, the manifest stores a fingerprint of its inputs: the job
+function and its parameters, the source code of the project, the content of its input
+files and the results of the jobs it depends on (e.g. the FRED data for a given
+vintage). In incremental mode, a job is skipped when its fingerprint has not changed
+and its outputs exist.
+
+The code is hashed as a whole (every module in the scripts folder), since a job's
+output depends on the helpers it calls as much as on the job function itself. Any
+change to the code therefore updates all the outputs.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import pickle
+
+import pandas as pd
+
+from scripts.config import Paths
+from scripts.debt.cache import file_hash
+
+MANIFEST_PATH = Paths.raw_data / "output_manifest.json"
+
+
+def load_manifest() -> dict:
+    """Load the manifest, or an empty one if it doesn't exist."""
+    if not MANIFEST_PATH.exists():
+        return {}
+
+    with open(MANIFEST_PATH, "r") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: dict) -> None:
+    """Save the manifest. The file is replaced in one step."""
+    temp = MANIFEST_PATH.with_suffix(".tmp")
+
+    with open(temp, "w") as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+
+    os.replace(temp, MANIFEST_PATH)
+
+
+def _function_id(func) -> str:
+    """Identify a function, including the arguments of a partial."""
+    if isinstance(func, functools.partial):
+        return (
+            f"{_function_id(func.func)}"
+            f"({func.args!r}, {sorted(func.keywords.items())!r})"
+        )
+
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+@functools.lru_cache(maxsize=None)
+def _code_hash() -> str:
+    """Hash the source code of all the modules in the scripts folder."""
+    key = hashlib.sha256()
+
+    for file in sorted(Paths.scripts.rglob("*.py")):
+        key.update(str(file.relative_to(Paths.project)).encode())
+        key.update(file_hash(file).encode())
+
+    return key.hexdigest()
+
+
+def _value_hash(value) -> str:
+    """Hash the result of a job."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return hashlib.sha256(
+            pd.util.hash_pandas_object(value, index=True).values.tobytes()
+        ).hexdigest()
+
+    return hashlib.sha256(pickle.dumps(value)).hexdigest()
+
+
+def fingerprint(func, inputs: tuple[str, ...], dependency_results: dict) -> str:
+    """Fingerprint the inputs of a job.
+
+    The inputs are glob patterns relative to the project folder.
+    """
+    key = hashlib.sha256()
+    key.update(_function_id(func).encode())
+    key.update(_code_hash().encode())
+
+    for pattern in inputs:
+        for file in sorted(Paths.project.glob(pattern)):
+            key.update(str(file.relative_to(Paths.project)).encode())
+            key.update(file_hash(file).encode())
+
+    for name, result in sorted(dependency_results.items()):
+        key.update(name.encode())
+        key.update(_value_hash(result).encode())
+
+    return key.hexdigest()
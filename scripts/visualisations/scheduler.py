@@ -0,0 +1,211 @@
+"""A small scheduler to run chart jobs in parallel.
+
+Each job declares the jobs it depends on. Jobs run on a process pool as soon as all
+their dependencies have finished, so independent jobs overlap. If a job function has
+a parameter with the name of one of its dependencies, the result of that dependency
+is passed to it. This allows shared data to be loaded once and reused.
+
+In incremental mode, jobs whose inputs have not changed since their outputs were
+last produced are skipped (see `scripts.visualisations.manifest`).
+
+The stages instrumented in each job (see `scripts.instrumentation`) are collected
+from the process which ran it, and can be saved as a run report.
+
+The outputs of the jobs (see `scripts.outputs`) are buffered, and only written once
+all the jobs have finished, so a failed run doesn't leave some outputs updated and
+others not. The manifest is only updated once the outputs are written.
+"""
+
+import inspect
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from scripts.config import Paths
+from scripts.instrumentation import collect_records, write_report
+from scripts.logger import logger
+from scripts.outputs import Outputs, buffered_outputs, write_outputs
+from scripts.visualisations.manifest import fingerprint, load_manifest, save_manifest
+
+
+@dataclass(frozen=True)
+class Job:
+    """A unit of work for the scheduler.
+
+    The function must be picklable (e.g. a module level function or a
+    functools.partial of one), and so must its result.
+
+    The outputs are the files the job writes, and the inputs the files it reads
+    (as glob patterns). Both are relative to the project folder. Only jobs with
+    outputs can be skipped in incremental mode.
+    """
+
+    name: str
+    func: Callable
+    depends_on: tuple[str, ...] = ()
+    outputs: tuple[str, ...] = ()
+    inputs: tuple[str, ...] = ()
+
+
+def _run_job(func: Callable, kwargs: dict) -> tuple[Any, float, list[dict], Outputs]:
+    """Run a job function, time it and collect the records of its stages and the
+    outputs it produced (which are not written yet)."""
+    # Workers are reused, so drop any records left by a previous job
+    collect_records()
+
+    start = time.perf_counter()
+    with buffered_outputs(write=False) as outputs:
+        result = func(**kwargs)
+
+    return result, time.perf_counter() - start, collect_records(), outputs
+
+
+def _parameters(func: Callable) -> set[str]:
+    """The names of the parameters of a job function (if they can be inspected)."""
+    try:
+        return set(inspect.signature(func).parameters)
+    except (TypeError, ValueError):
+        return set()
+
+
+def _validate_jobs(jobs: list[Job]) -> None:
+    """Check that job names are unique and that all dependencies exist."""
+    names = [job.name for job in jobs]
+
+    if len(names) != len(set(names)):
+        raise ValueError("Job names must be unique")
+
+    for job in jobs:
+        for dependency in job.depends_on:
+            if dependency not in names:
+                raise ValueError(f"{job.name} depends on unknown job '{dependency}'")
+
+
+def _is_up_to_date(job: Job, manifest: dict, job_fingerprint: str) -> bool:
+    """Check if the outputs of a job exist and were produced from the same inputs."""
+    return (
+        len(job.outputs) > 0
+        and manifest.get(job.name) == job_fingerprint
+        and all((Paths.project / output).exists() for output in job.outputs)
+    )
+
+
+def run_jobs(
+    jobs: list[Job],
+    max_workers: int | None = None,
+    incremental: bool = False,
+    report: str | None = None,
+    mirrors: tuple[str, ...] = (),
+) -> dict[str, Any]:
+    """Run the jobs on a process pool, respecting their dependencies.
+
+    If incremental is True, jobs whose outputs are up-to-date are skipped. A job is
+    never skipped if one of its dependencies with outputs has run.
+
+    If report is the name of the pipeline, the stages of the jobs are saved under
+    that name in the run report. The CSV outputs are also mirrored in the mirror
+    formats (see `scripts.outputs.MIRROR_FORMATS`).
+
+    Returns a dictionary with the result of each job (None for skipped jobs).
+    """
+    _validate_jobs(jobs)
+
+    pending = {job.name: job for job in jobs}
+    job_outputs = {job.name: job.outputs for job in jobs}
+    running = {}
+    results = {}
+    fingerprints = {}
+    executed = set()
+    skipped = []
+    records = []
+    outputs = Outputs()
+    manifest = load_manifest() if incremental else {}
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            # Submit all jobs whose dependencies have finished. Skipped jobs finish
+            # immediately, so repeat until no more jobs are ready.
+            ready = True
+            while ready:
+                ready = [
+                    name
+                    for name, job in pending.items()
+                    if all(dependency in results for dependency in job.depends_on)
+                ]
+
+                for name in ready:
+                    job = pending.pop(name)
+                    dependency_results = {d: results[d] for d in job.depends_on}
+
+                    if incremental and job.outputs:
+                        fingerprints[name] = fingerprint(
+                            job.func, job.inputs, dependency_results
+                        )
+                        upstream_changed = any(
+                            d in executed and job_outputs[d] for d in job.depends_on
+                        )
+                        if not upstream_changed and _is_up_to_date(
+                            job, manifest, fingerprints[name]
+                        ):
+                            results[name] = None
+                            skipped.extend(job.outputs)
+                            logger.info(f"Skipped {name} (inputs unchanged)")
+                            continue
+
+                    parameters = _parameters(job.func)
+                    kwargs = {
+                        dependency: result
+                        for dependency, result in dependency_results.items()
+                        if dependency in parameters
+                    }
+                    running[pool.submit(_run_job, job.func, kwargs)] = name
+                    logger.info(f"Started {name}")
+
+            if not running:
+                if pending:
+                    raise ValueError(f"Circular dependencies between {list(pending)}")
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                name = running.pop(future)
+
+                try:
+                    results[name], seconds, job_records, produced = future.result()
+                except Exception:
+                    logger.error(f"{name} failed")
+                    for other in running:
+                        other.cancel()
+                    raise
+
+                executed.add(name)
+                records.extend({"job": name, **record} for record in job_records)
+                outputs.update(produced)
+                logger.info(f"Finished {name} in {seconds:.1f}s")
+
+    changed = write_outputs(outputs, mirrors=mirrors)
+    logger.info(f"Wrote {len(changed)} changed outputs (of {len(outputs)})")
+
+    # Record the inputs used to produce the outputs
+    if incremental:
+        manifest.update(
+            {name: fingerprints[name] for name in executed & set(fingerprints)}
+        )
+        save_manifest(manifest)
+
+    seconds = time.perf_counter() - start
+    logger.info(f"Finished {len(jobs)} jobs in {seconds:.1f}s")
+
+    if report:
+        # Include the stages which ran in this process (e.g. writing the outputs)
+        records.extend({"job": None, **record} for record in collect_records())
+        write_report(report, records, wall_time=seconds)
+
+    if incremental:
+        skipped = sorted(set(skipped))
+        logger.info(f"Skipped {len(skipped)} up-to-date outputs: {skipped}")
+
+    return results
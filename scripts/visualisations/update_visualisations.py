@@ -1,70 +1,112 @@
-import datetime
-import json
-import os
+"""Update the data of the visualisations.
+
+The chart modules (and with them bblocks, country_converter, etc.) are only imported
+when the job which needs them runs, so running a single job doesn't pay for loading
+every subsystem. Nothing is read or downloaded when this module is imported.
 
-from bblocks import WFPData, WorldEconomicOutlook
+The remote data of a pipeline is downloaded first, concurrently for all its sources
+(see `scripts.fetch`). The jobs then only read local files.
+"""
+
+import argparse
+import datetime
+import importlib
+from functools import partial
+from typing import Any
 
 from scripts import config
-from scripts.fed_rates.rates_chart import (
-    update_fed_rate_hikes_chart_data,
-    wide_fed_rates_chart,
-)
-from scripts.inflation.inflation_charts import inflation_key_numbers
+from scripts.fetch import Source, prefetch
 from scripts.logger import logger
-from scripts.social_spending.debt_social_chart import debt_health_comparison_chart
-from scripts.visualisations.interest_flourish import (
-    chart_africa_other_bondholders_ibrd_line,
-    chart_data_africa_other_rates_scatter,
-    chart_scrolly_bars_africa_bonds_vs_ibrd_rates,
-    chart_scrolly_bars_mics_bonds_vs_ibrd_rates,
-    chart_scrolly_chart_map_africa_bonds_2021_rates,
-    chart_scrolly_chart_map_africa_ibrd_2021_rates,
-    export_africa_geometries,
-)
+from scripts.outputs import MIRROR_FORMATS, update_key_numbers
+from scripts.visualisations.scheduler import Job, run_jobs
 
 
-def update_key_number(path: str, new_dict: dict) -> None:
-    """Update a key number json by updating it with a new dictionary"""
+def _bblocks_job(module: str, name: str, **kwargs) -> Any:
+    """Import a function which uses bblocks data and call it with the keyword
+    arguments. The module is only imported when the job runs."""
+    config.set_bblocks_path()
 
-    # Check if the file exists, if not create
-    if not os.path.exists(path):
-        with open(path, "w") as f:
-            json.dump({}, f)
+    return getattr(importlib.import_module(module), name)(**kwargs)
 
-    with open(path, "r") as f:
-        data = json.load(f)
 
-    for k in new_dict.keys():
-        data[k] = new_dict[k]
+# ---------------------- FED RATES CHART ---------------------- #
 
-    with open(path, "w") as f:
-        json.dump(data, f, indent=4)
 
+def load_fed_data():
+    """Get the effective federal funds rate from the local cache (see `get_fed_data`)"""
+    from scripts.fed_rates.rates_chart import get_fed_data
+
+    return get_fed_data(download=False)
 
-# ---------------------- FED RATES CHART ---------------------- #
 
+def update_fed_charts(fed_data=None) -> None:
+    from scripts.fed_rates.rates_chart import (
+        update_fed_rate_hikes_chart_data,
+        wide_fed_rates_chart,
+    )
 
-def update_fed_charts() -> None:
-    update_fed_rate_hikes_chart_data()
+    update_fed_rate_hikes_chart_data(df=fed_data)
     wide_fed_rates_chart()
 
 
 # ---------------------- INFLATION ---------------------- #
-def update_inflation_data() -> None:
-    # Update the raw data
+def update_wfp_data() -> None:
+    """Update the raw inflation data"""
+    from bblocks import WFPData
+
+    config.set_bblocks_path()
     wfp = WFPData()
     wfp.load_data("inflation")
-    wfp.update_data(True)
+    # The data is read with `read_wfp_inflation`, so there is no need to reload it
+    wfp.update_data(reload_data=False)
 
-    # Update key numbers
+
+def update_inflation_key_numbers() -> None:
+    from scripts.inflation.inflation_charts import inflation_key_numbers
+
+    config.set_bblocks_path()
     data = inflation_key_numbers()
-    update_key_number(config.Paths.output / "inflation_key_numbers.json", data)
+    update_key_numbers(config.Paths.output / "inflation_key_numbers.json", data)
+
+
+def update_inflation_data() -> None:
+    # Update the raw data
+    update_wfp_data()
+
+    # Update key numbers
+    update_inflation_key_numbers()
 
 
 # ---------------------- INTEREST RATES CHART ---------------------- #
 
+INTEREST_CHARTS = "scripts.visualisations.interest_flourish"
+
+
+def update_loans_data(update_data: bool = True) -> None:
+    """Update the IDS data used by the interest rates charts. If update_data is
+    False, the data is only prepared from the local files."""
+    from scripts.debt.interest_analysis import (
+        get_merged_rates_commitments_grace_maturities_data,
+    )
+
+    config.set_bblocks_path()
+    get_merged_rates_commitments_grace_maturities_data(
+        start_year=2017, end_year=2021, update_data=update_data
+    )
+
 
 def update_interest_data_and_charts() -> None:
+    from scripts.visualisations.interest_flourish import (
+        chart_africa_other_bondholders_ibrd_line,
+        chart_data_africa_other_rates_scatter,
+        chart_scrolly_bars_africa_bonds_vs_ibrd_rates,
+        chart_scrolly_bars_mics_bonds_vs_ibrd_rates,
+        chart_scrolly_chart_map_africa_bonds_2021_rates,
+        chart_scrolly_chart_map_africa_ibrd_2021_rates,
+        export_africa_geometries,
+    )
+
+    config.set_bblocks_path()
     export_africa_geometries()
     chart_scrolly_bars_africa_bonds_vs_ibrd_rates(update_data=True)
     chart_scrolly_bars_mics_bonds_vs_ibrd_rates()
@@ -77,34 +119,306 @@ def update_interest_data_and_charts() -> None:
 # ---------------------- HEALTH DEBT DATA  ---------------------- #
 
 
+def update_weo_data() -> None:
+    """Update the WEO data used by the debt and health chart"""
+    from scripts.weo import update_weo
+
+    config.set_bblocks_path()
+    update_weo()
+
+
 def update_debt_health_chart_data() -> None:
-    indicator = "NGDPD"
-    weo = WorldEconomicOutlook()
-    weo.load_data(indicator=indicator)
-    weo.update_data(reload_data=True, year=None, release=None)
+    from scripts.social_spending.debt_social_chart import (
+        debt_health_comparison_chart,
+    )
+
+    update_weo_data()
     debt_health_comparison_chart()
 
 
-def update_visualisations() -> None:
-    """Pipeline to update all visualisations"""
+# ---------------------- REMOTE SOURCES ---------------------- #
+
+# Number of IDS series codes downloaded by each request
+IDS_CHUNK_SIZE: int = 3
+
+
+def _update_ids(series_codes: list[str], update: bool) -> None:
+    """Download IDS series codes (2000-2021) to the store. If update is False, only
+    the series codes which are not in the store yet are downloaded."""
+    from scripts.debt.ids_store import update_store
+
+    config.set_bblocks_path()
+    update_store(series_codes, start_year=2000, end_year=2021, update=update)
+
+
+def _update_fred(series: str, url: str | None = None) -> None:
+    """Download today's vintage of a FRED series to the cache. The requests of the
+    download (e.g. retries) reuse the same connection."""
+    import requests
+
+    from scripts.fed_rates.fred import FRED_URL, get_fred_series, session_transport
+
+    with requests.Session() as session:
+        get_fred_series(
+            series, transport=session_transport(session), url=url or FRED_URL
+        )
+
 
-    update_fed_charts()
-    logger.info("Updated FED charts")
+def fred_source(url: str | None = None) -> Source:
+    """Today's vintage of the effective federal funds rate. The url can be changed,
+    for example to serve the data from a local server."""
+    return Source(
+        "fred",
+        tasks={"FEDFUNDS": partial(_update_fred, "FEDFUNDS", url=url)},
+        timeout=120,
+        attempts=2,
+    )
 
-    update_inflation_data()
-    logger.info("Updated inflation data")
 
+def wfp_source() -> Source:
+    """The WFP inflation data"""
+    return Source("wfp", tasks={"inflation": update_wfp_data}, timeout=900)
 
-def update_other_visualisations() -> None:
-    """Pipeline to update visualisations with data that is infrequently updated"""
-    update_interest_data_and_charts()
-    logger.info("Updated interest data and charts")
 
-    update_debt_health_chart_data()
-    logger.info("Updated debt health chart data")
+def weo_source() -> Source:
+    """The latest WEO release"""
+    return Source("weo", tasks={"release": update_weo_data}, timeout=900)
+
+
+def ids_source() -> Source:
+    """The IDS series used by the interest rates charts. The loans data is updated,
+    and the interest payments are only downloaded if they are missing."""
+    from scripts.debt.interest_analysis import (
+        COMMITMENTS_INDICATORS,
+        GRACE_PERIOD_INDICATOR,
+        INTEREST_PAYMENTS_INDICATORS,
+        INTEREST_RATE_INDICATOR,
+        MATURITY_INDICATOR,
+    )
+
+    loans = [
+        *COMMITMENTS_INDICATORS,
+        INTEREST_RATE_INDICATOR,
+        GRACE_PERIOD_INDICATOR,
+        MATURITY_INDICATOR,
+    ]
+    tasks = {
+        f"loans {i // IDS_CHUNK_SIZE + 1}": partial(
+            _update_ids, loans[i : i + IDS_CHUNK_SIZE], update=True
+        )
+        for i in range(0, len(loans), IDS_CHUNK_SIZE)
+    }
+    tasks["payments"] = partial(
+        _update_ids, list(INTEREST_PAYMENTS_INDICATORS), update=False
+    )
+
+    return Source("ids", tasks=tasks, max_concurrent=2, min_interval=1.0, timeout=900)
+
+
+def visualisation_sources() -> list[Source]:
+    """Remote sources of the visualisations which are updated often"""
+    return [fred_source(), wfp_source()]
+
+
+def other_visualisation_sources() -> list[Source]:
+    """Remote sources of the visualisations which are infrequently updated"""
+    return [ids_source(), weo_source()]
+
+
+# ---------------------- JOBS ---------------------- #
+
+# Input files of the jobs, as glob patterns relative to the project folder
+IDS_INPUTS = (
+    "raw_data/ids_data/*.feather",
+    "raw_data/ids_store/*.feather",
+    "raw_data/income_levels.csv",
+)
+WEO_INPUTS = ("raw_data/weo*.csv", "raw_data/bblocks_data/weo*.csv")
+WFP_INPUTS = ("raw_data/wfp_raw/*.csv", "raw_data/bblocks_data/wfp_raw/*.csv")
+
+
+def visualisation_jobs() -> list[Job]:
+    """Jobs to update all visualisations"""
+    return [
+        Job("fed_data", load_fed_data),
+        Job(
+            "fed_charts",
+            update_fed_charts,
+            depends_on=("fed_data",),
+            outputs=(
+                "output/fed_rate_hikes.csv",
+                "output/fed_rate_hikes_wide_flourish_chart.csv",
+            ),
+        ),
+        Job(
+            "inflation_key_numbers",
+            update_inflation_key_numbers,
+            outputs=("output/inflation_key_numbers.json",),
+            inputs=WFP_INPUTS + WEO_INPUTS,
+        ),
+    ]
+
+
+def other_visualisation_jobs() -> list[Job]:
+    """Jobs to update visualisations with data that is infrequently updated"""
+    interest_charts = {
+        "scrolly_bars_africa": (
+            partial(
+                _bblocks_job,
+                INTEREST_CHARTS,
+                "chart_scrolly_bars_africa_bonds_vs_ibrd_rates",
+            ),
+            "output/scrolly_bars_africa_bonds_vs_at_ibrd_rates.csv",
+        ),
+        "scrolly_bars_mics": (
+            partial(
+                _bblocks_job,
+                INTEREST_CHARTS,
+                "chart_scrolly_bars_mics_bonds_vs_ibrd_rates",
+            ),
+            "output/scrolly_bars_mics_bonds_vs_at_ibrd_rates.csv",
+        ),
+        "smooth_line": (
+            partial(
+                _bblocks_job,
+                INTEREST_CHARTS,
+                "chart_africa_other_bondholders_ibrd_line",
+                start_year=2000,
+                end_year=2021,
+            ),
+            "output/afr_others_rates_smooth_line_2000_2021.csv",
+        ),
+        "scatter": (
+            partial(
+                _bblocks_job,
+                INTEREST_CHARTS,
+                "chart_data_africa_other_rates_scatter",
+                start_year=2000,
+                end_year=2021,
+            ),
+            "output/afr_others_rates_scatter_2000_2021.csv",
+        ),
+        "scrolly_map_ibrd": (
+            partial(
+                _bblocks_job,
+                INTEREST_CHARTS,
+                "chart_scrolly_chart_map_africa_ibrd_2021_rates",
+            ),
+            "output/scrolly_chart_map_ibrd_africa_2021_rates.csv",
+        ),
+    }
+
+    return [
+        Job(
+            "africa_geometries",
+            partial(_bblocks_job, INTEREST_CHARTS, "export_africa_geometries"),
+            outputs=("output/africa_geometries.csv",),
+            # The geometries and country list come with bblocks and country_converter
+            inputs=("requirements.txt",),
+        ),
+        Job("loans_data", partial(update_loans_data, update_data=False)),
+        *[
+            Job(
+                name,
+                chart,
+                depends_on=("loans_data",),
+                outputs=(output,),
+                inputs=IDS_INPUTS,
+            )
+            for name, (chart, output) in interest_charts.items()
+        ],
+        # The bonds map writes to the same file as the IBRD map, so it must run after it
+        Job(
+            "scrolly_map_bonds",
+            partial(
+                _bblocks_job,
+                INTEREST_CHARTS,
+                "chart_scrolly_chart_map_africa_bonds_2021_rates",
+            ),
+            depends_on=("loans_data", "scrolly_map_ibrd"),
+            outputs=("output/scrolly_chart_map_ibrd_africa_2021_rates.csv",),
+            inputs=IDS_INPUTS,
+        ),
+        Job(
+            "debt_health",
+            partial(
+                _bblocks_job,
+                "scripts.social_spending.debt_social_chart",
+                "debt_health_comparison_chart",
+            ),
+            outputs=("output/debt_health_2020.csv",),
+            inputs=(
+                "raw_data/ids_service_raw.feather",
+                "raw_data/health_spending_gdp.csv",
+                "raw_data/education_spending_gdp.csv",
+                "raw_data/income_levels.csv",
+            )
+            + WEO_INPUTS,
+        ),
+    ]
+
+
+def update_visualisations(
+    incremental: bool = False, mirrors: tuple[str, ...] = (), fetch: bool = True
+) -> None:
+    """Pipeline to update all visualisations.
+
+    The remote data is downloaded first, unless fetch is False.
+    If incremental is True, outputs whose inputs have not changed are not updated.
+    The CSV outputs are also mirrored in the mirror formats.
+    """
+    if fetch:
+        prefetch(visualisation_sources())
+
+    run_jobs(
+        visualisation_jobs(),
+        incremental=incremental,
+        report="visualisations",
+        mirrors=mirrors,
+    )
+    logger.info("Updated FED charts and inflation data")
+
+
+def update_other_visualisations(
+    incremental: bool = False, mirrors: tuple[str, ...] = (), fetch: bool = True
+) -> None:
+    """Pipeline to update visualisations with data that is infrequently updated.
+
+    The remote data is downloaded first, unless fetch is False.
+    If incremental is True, outputs whose inputs have not changed are not updated.
+    The CSV outputs are also mirrored in the mirror formats.
+    """
+    if fetch:
+        prefetch(other_visualisation_sources())
+
+    run_jobs(
+        other_visualisation_jobs(),
+        incremental=incremental,
+        report="other_visualisations",
+        mirrors=mirrors,
+    )
+    logger.info("Updated interest data and charts and debt health chart data")
 
 
 if __name__ == "__main__":
-    update_visualisations()
+    parser = argparse.ArgumentParser(description="Update the visualisations data")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only update outputs whose inputs have changed",
+    )
+    parser.add_argument(
+        "--mirrors",
+        nargs="+",
+        default=[],
+        choices=MIRROR_FORMATS,
+        help="Also write the CSV outputs in these formats",
+    )
+    args = parser.parse_args()
+
+    # Each pipeline downloads its own data, so a failed download of the other
+    # pipeline doesn't stop the FED and inflation charts from being updated
+    mirrors = tuple(args.mirrors)
+    update_visualisations(incremental=args.incremental, mirrors=mirrors)
     if datetime.datetime.weekday(datetime.datetime.now()) == 0:
-        update_other_visualisations()
+        update_other_visualisations(incremental=args.incremental, mirrors=mirrors)
@@ -0,0 +1,87 @@
+"""A shared panel of the IMF World Economic Outlook (WEO) indicators.
+
+bblocks parses the whole WEO release every time a `WorldEconomicOutlook` object
+loads data, so each getter which creates its own object parses the release again.
+Here, all the indicators used in the project are loaded in a single pass into a wide
+(iso_code, year) frame, which is kept for the rest of the process. The per-indicator
+getters are served from that frame.
+
+bblocks always reads the latest release on disk, so the panel is kept until a new
+release is downloaded with `update_weo`.
+"""
+
+import threading
+
+import pandas as pd
+
+from scripts.logger import logger
+
+# Indicators loaded in the panel, by WEO subject code
+PANEL_INDICATORS: tuple[str, ...] = ("GGR_NGDP", "GGX_NGDP", "NGDPD", "PPPGDP")
+
+_lock = threading.Lock()
+_panel: pd.DataFrame | None = None
+
+
+def _load_panel(indicators: list[str]) -> pd.DataFrame:
+    """Parse the WEO release once and pivot the indicators to a wide frame."""
+    from bblocks import WorldEconomicOutlook
+
+    weo = WorldEconomicOutlook()
+    weo.load_data(indicators)
+
+    logger.debug(f"Loaded the WEO panel ({weo.version}): {indicators}")
+
+    return (
+        weo.get_data()
+        .assign(year=lambda d: d.year.dt.year)
+        .pivot(index=["iso_code", "year"], columns="indicator", values="value")
+        .sort_index()
+        .rename_axis(columns=None)
+    )
+
+
+def weo_panel(indicators: list[str] | None = None) -> pd.DataFrame:
+    """The WEO indicators as a wide frame, indexed by iso_code and year (as int).
+
+    Only the rows with data for at least one of the indicators are returned. The
+    panel holds all the PANEL_INDICATORS, as well as any other indicators that were
+    requested. It is only loaded again if an indicator is missing from it.
+    """
+    global _panel
+
+    indicators = list(PANEL_INDICATORS if indicators is None else indicators)
+
+    with _lock:
+        if _panel is None or not set(indicators).issubset(_panel.columns):
+            loaded = [] if _panel is None else list(_panel.columns)
+            _panel = _load_panel(
+                list(dict.fromkeys([*PANEL_INDICATORS, *loaded, *indicators]))
+            )
+
+        return _panel[indicators].dropna(how="all")
+
+
+def weo_indicator(indicator: str) -> pd.DataFrame:
+    """A single indicator, in the long format of `WorldEconomicOutlook.get_data`
+    (iso_code, indicator, year and value), but with the year as int."""
+    return (
+        weo_panel([indicator])[indicator]
+        .dropna()
+        .rename("value")
+        .reset_index()
+        .assign(indicator=indicator)
+        .filter(["iso_code", "indicator", "year", "value"], axis=1)
+    )
+
+
+def update_weo() -> None:
+    """Download the latest WEO release, and discard the panel in memory."""
+    global _panel
+
+    from bblocks import WorldEconomicOutlook
+
+    WorldEconomicOutlook().update_data(year=None, release=None, reload_data=False)
+
+    with _lock:
+        _panel = None